@@ -41,6 +41,18 @@ function install() {
     cp -v shannon_debug_traces.py ${IDADIR}/python/
     cp -v shannon_funcs.py ${IDADIR}/python/
     cp -v shannon_indirect_xref.py ${IDADIR}/python/
+    cp -v shannon_image.py ${IDADIR}/python/
+    cp -v shannon_lz4.py ${IDADIR}/python/
+    cp -v shannon_batch.py ${IDADIR}/python/
+    cp -v shannon_cache.py ${IDADIR}/python/
+    cp -v shannon_transfer.py ${IDADIR}/python/
+    cp -v shannon_fingerprint.py ${IDADIR}/python/
+    cp -v shannon_strings.py ${IDADIR}/python/
+    cp -v shannon_dbt.py ${IDADIR}/python/
+    cp -v shannon_registry.py ${IDADIR}/python/
+    cp -v shannon_mangle.py ${IDADIR}/python/
+    cp -v shannon_decompress.py ${IDADIR}/python/
+    cp -v shannon_elf.py ${IDADIR}/python/
 
     cp -v sig/*.sig ${IDADIR}/sig/arm/
 }
@@ -0,0 +1,286 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - Batch Driver
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# Runs the loader and post-processor headless over a directory of modem images.
+# Every image is analysed by its own IDA process (idat -A -S or idalib), at most
+# --jobs at a time. The post-processor writes a json summary per image. The work
+# queue is kept in batch_state.json inside the output directory, a restarted batch
+# skips finished images and retries the ones which crashed.
+
+import argparse
+import concurrent.futures
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+import shannon_image
+
+STATE_FILE = "batch_state.json"
+
+# states of a queue entry
+STATE_PENDING = "pending"
+STATE_RUNNING = "running"
+STATE_DONE = "done"
+STATE_FAILED = "failed"
+
+# find all inputs the loader accepts, raw images, lz4 images and CP archives
+def find_images(input_dir):
+
+    images = []
+
+    for root, dirs, files in os.walk(input_dir):
+
+        dirs.sort()
+
+        for name in sorted(files):
+
+            path = os.path.abspath(os.path.join(root, name))
+
+            try:
+                if (shannon_image.probe(path)):
+                    images.append(path)
+            except (OSError, ValueError):
+                continue
+
+    return images
+
+# unique file name stem of an image inside the output directory
+def image_stem(input_dir, path):
+
+    rel = os.path.relpath(path, input_dir)
+
+    return rel.replace(os.sep, "_").replace(".", "_")
+
+class BatchQueue:
+
+    def __init__(self, output_dir):
+
+        self.path = os.path.join(output_dir, STATE_FILE)
+        self.entries = {}
+
+        if (os.path.exists(self.path)):
+            with open(self.path) as f:
+                self.entries = json.load(f)
+
+    def save(self):
+
+        tmp_path = self.path + ".tmp"
+
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f, indent=2)
+
+        # atomic, a killed driver never leaves a broken queue behind
+        os.replace(tmp_path, self.path)
+
+    def add(self, image, stem):
+
+        if (image not in self.entries):
+            self.entries[image] = {"stem": stem, "status": STATE_PENDING, "attempts": 0}
+
+    # everything which did not finish, running entries are left overs of a crashed batch
+    def pending(self, retries, force=False):
+
+        todo = []
+
+        for image, entry in self.entries.items():
+
+            if (force):
+                entry["status"] = STATE_PENDING
+                entry["attempts"] = 0
+
+            if (entry["status"] == STATE_DONE):
+                continue
+
+            if (entry["status"] == STATE_FAILED and entry["attempts"] > retries):
+                continue
+
+            todo.append(image)
+
+        return todo
+
+    def update(self, image, **kwargs):
+
+        self.entries[image].update(kwargs)
+        self.save()
+
+# build the command line for one headless IDA run
+def ida_command(args, image, db_path, log_path):
+
+    if (args.backend == "idalib"):
+        return [sys.executable, os.path.abspath(__file__), "worker", image, db_path]
+
+    # -c replaces the database of an earlier attempt, the -S script saves and exits
+    script = '-S"%s" script' % os.path.abspath(__file__)
+
+    return [args.ida, "-A", "-c", "-TShannon", script, "-o" + db_path, "-L" + log_path, image]
+
+# analyse a single image, runs in a pool thread which waits for the IDA process
+def analyse(args, image, stem):
+
+    db_path = os.path.join(args.output, stem)
+    log_path = os.path.join(args.output, stem + ".log")
+    summary_path = os.path.join(args.output, stem + ".json")
+
+    if (os.path.exists(summary_path)):
+        os.unlink(summary_path)
+
+    env = dict(os.environ)
+    env["SHANNON_SUMMARY"] = summary_path
+    env["SHANNON_WORKFLOW"] = "YES"
+
+    if (args.elf):
+        env["SHANNON_ELF_EXPORT"] = os.path.join(args.output, stem + ".elf")
+
+    start_time = time.time()
+
+    try:
+        with open(log_path, "a") as log:
+            proc = subprocess.run(ida_command(args, image, db_path, log_path), env=env,
+                                  stdout=log, stderr=subprocess.STDOUT, timeout=args.timeout)
+        returncode = proc.returncode
+    except subprocess.TimeoutExpired:
+        returncode = None
+
+    wall_time = time.time() - start_time
+
+    if (not os.path.exists(summary_path)):
+        return image, False, returncode, wall_time
+
+    with open(summary_path) as f:
+        summary = json.load(f)
+
+    summary["wall_time"] = wall_time
+    summary["database"] = db_path
+    summary["log"] = log_path
+
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    return image, True, returncode, wall_time
+
+def cmd_run(args):
+
+    if (args.backend == "idat" and shutil.which(args.ida) == None and not os.path.exists(args.ida)):
+        print("[e] cannot find %s, use --ida to point to idat" % args.ida)
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+
+    queue = BatchQueue(args.output)
+
+    for image in find_images(args.input):
+        queue.add(image, image_stem(args.input, image))
+
+    todo = queue.pending(args.retries, args.force)
+
+    print("[i] %d images in queue, %d to analyse with %d jobs" % (len(queue.entries), len(todo), args.jobs))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=args.jobs) as pool:
+
+        futures = {}
+
+        for image in todo:
+
+            entry = queue.entries[image]
+            queue.update(image, status=STATE_RUNNING, attempts=entry["attempts"] + 1)
+
+            futures[pool.submit(analyse, args, image, entry["stem"])] = image
+
+        for future in concurrent.futures.as_completed(futures):
+
+            image = futures[future]
+
+            # whatever goes wrong with one image (a broken summary, a log which cannot be
+            # written, ...) only fails this image, the batch goes on with the others
+            try:
+                image, success, returncode, wall_time = future.result()
+            except Exception as e:
+                queue.update(image, status=STATE_FAILED, error=str(e))
+                print("[e] failed %s: %s" % (image, e))
+                continue
+
+            if (success):
+                queue.update(image, status=STATE_DONE, returncode=returncode, wall_time=wall_time, error=None)
+                print("[i] done %s in %d seconds" % (image, wall_time))
+            else:
+                queue.update(image, status=STATE_FAILED, returncode=returncode, wall_time=wall_time, error=None)
+                print("[e] failed %s (exit code %s), see log" % (image, returncode))
+
+    failed = [image for image, entry in queue.entries.items() if entry["status"] != STATE_DONE]
+
+    print("[i] batch finished, %d done, %d failed" % (len(queue.entries) - len(failed), len(failed)))
+
+    return 1 if failed else 0
+
+# idat script (-S), runs inside IDA once the loader is done. The auto analysis and the
+# post-processor, which is hooked to its end, run in auto_wait(), then the database is
+# saved and IDA exits without any dialog
+def cmd_script(args):
+
+    import ida_auto
+    import idc
+
+    ida_auto.auto_wait()
+
+    idc.save_database("")
+    idc.qexit(0)
+
+# idalib worker, opens the image in a fresh database and lets the loader and
+# post-processor do their work before the database is closed
+def cmd_worker(args):
+
+    import idapro
+
+    ida_args = "-TShannon -o" + args.database
+
+    try:
+        ret = idapro.open_database(args.image, True, ida_args)
+    except TypeError:
+        # older idalib versions do not take command line arguments
+        ret = idapro.open_database(args.image, True)
+
+    if (ret != 0):
+        print("[e] idalib failed to open %s (%d)" % (args.image, ret))
+        return 1
+
+    idapro.close_database(True)
+
+    return 0
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Shannon modem batch analysis")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="analyse all images in a directory")
+    run.add_argument("input")
+    run.add_argument("output")
+    run.add_argument("-j", "--jobs", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    run.add_argument("--backend", choices=["idat", "idalib"], default="idat")
+    run.add_argument("--ida", default="idat", help="path of the idat binary")
+    run.add_argument("--timeout", type=int, default=None, help="seconds per image")
+    run.add_argument("--retries", type=int, default=1, help="retries for failed images")
+    run.add_argument("--force", action="store_true", help="analyse finished images again")
+    run.add_argument("--elf", action="store_true", help="also export an unpacked ELF per image")
+    run.set_defaults(func=cmd_run)
+
+    worker = sub.add_parser("worker", help=argparse.SUPPRESS)
+    worker.add_argument("image")
+    worker.add_argument("database")
+    worker.set_defaults(func=cmd_worker)
+
+    script = sub.add_parser("script", help=argparse.SUPPRESS)
+    script.set_defaults(func=cmd_script)
+
+    args = parser.parse_args(argv)
+
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
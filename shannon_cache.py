@@ -0,0 +1,421 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - Result Cache
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# The post-processor takes about 10 minutes and always comes to the same result
+# for the same image. While it runs, a recorder hooks the idb events and collects
+# everything it changes: names, comments, segments, functions with their bounds and
+# deletions, data items like the DBT, scatter and task structs, scatter patches and
+# added xrefs. The results are stored keyed by the sha256 of the MAIN segment. Loading
+# the same image again replays the store in one bulk pass instead of running the
+# heuristics.
+
+import idc
+import idaapi
+import ida_idp
+import ida_bytes
+import ida_funcs
+import ida_nalt
+import ida_name
+import ida_range
+import ida_segment
+
+import hashlib
+import json
+import os
+import shutil
+
+import shannon_generic
+import shannon_image
+import shannon_strings
+
+# bump if the post-processor changes in a way that invalidates stored results
+CACHE_VERSION = 3
+
+RESULTS_FILE = "results.json"
+PATCHES_FILE = "patches.bin"
+
+# patched bytes are moved between the database and the store in chunks
+PATCH_CHUNK_SIZE = 0x100000
+
+# the active recorder, None if nothing is recorded
+recorder = None
+
+# content address of the loaded image, set by the loader
+def get_image_hash():
+
+    main_hash = shannon_generic.get_image_info("main_sha256")
+
+    if (main_hash != None):
+        return main_hash
+
+    # databases created by older loader versions, hash what is mapped
+    seg_t = ida_segment.get_segm_by_name("MAIN_file")
+
+    if (seg_t == None):
+        return None
+
+    return hashlib.sha256(ida_bytes.get_bytes(seg_t.start_ea, seg_t.end_ea - seg_t.start_ea)).hexdigest()
+
+def is_enabled():
+    return (os.environ.get("SHANNON_RESULT_CACHE") != "NO")
+
+def get_store_path(image_hash):
+    return os.path.join(shannon_image.cache_dir(), "results", image_hash)
+
+# record an explicitly added xref, there is no idb event for these
+def record_xref(frm, to, xref_type):
+
+    if (recorder != None):
+        recorder.xrefs.append([frm, to, xref_type])
+
+# record bytes written into the database, put_bytes does not create an event. Strings
+# read from the range before are stale, the catalog reads it again
+def record_patch(ea, size):
+
+    shannon_strings.invalidate(ea, ea + size)
+
+    if (recorder != None):
+        recorder.patches.append([ea, size])
+
+# record a value of the image info netnode, written by the post-processor
+def record_info(key):
+
+    if (recorder != None):
+        recorder.info.add(key)
+
+class result_recorder_t(ida_idp.IDB_Hooks):
+
+    def __init__(self):
+
+        ida_idp.IDB_Hooks.__init__(self)
+
+        self.names = set()
+        self.cmts = set()
+        self.func_cmts = set()
+        self.segments = []
+        self.funcs = set()
+        self.deleted_funcs = set()
+        self.data = {}
+        self.xrefs = []
+        self.patches = []
+        self.info = set()
+
+    def renamed(self, ea, new_name, *args):
+        self.names.add(ea)
+        return 0
+
+    def cmt_changed(self, ea, repeatable_cmt):
+        self.cmts.add((ea, bool(repeatable_cmt)))
+        return 0
+
+    def range_cmt_changed(self, kind, a, cmt, repeatable):
+        if (kind == ida_range.RANGE_KIND_FUNC):
+            self.func_cmts.add((a.start_ea, bool(repeatable)))
+        return 0
+
+    def segm_added(self, s):
+        self.segments.append(s.start_ea)
+        return 0
+
+    def func_added(self, pfn):
+        self.funcs.add(pfn.start_ea)
+        return 0
+
+    def func_updated(self, pfn):
+        self.funcs.add(pfn.start_ea)
+        return 0
+
+    # the start moves, the old start is gone unless a function starts there in the end
+    def set_func_start(self, pfn, new_start):
+        self.deleted_funcs.add(pfn.start_ea)
+        self.funcs.add(new_start)
+        return 0
+
+    def set_func_end(self, pfn, new_end):
+        self.funcs.add(pfn.start_ea)
+        return 0
+
+    def func_deleted(self, func_ea):
+        self.deleted_funcs.add(func_ea)
+        return 0
+
+    def make_data(self, ea, flags, tid, size):
+        self.data[ea] = tid
+        return 0
+
+    # read the final state of everything that was touched, items which were
+    # created and removed again by the heuristics are dropped here
+    def collect(self):
+
+        results = {"version": CACHE_VERSION}
+
+        segments = []
+
+        for start in sorted(set(self.segments)):
+
+            seg_t = ida_segment.getseg(start)
+
+            if (seg_t == None or seg_t.start_ea != start):
+                continue
+
+            segments.append([start, seg_t.end_ea, ida_segment.get_segm_name(seg_t),
+                             ida_segment.get_segm_class(seg_t), seg_t.type, seg_t.perm])
+
+        results["segments"] = segments
+
+        funcs = []
+
+        for start in sorted(self.funcs):
+
+            func_o = ida_funcs.get_func(start)
+
+            if (func_o != None and func_o.start_ea == start):
+                funcs.append([start, func_o.end_ea])
+
+        results["funcs"] = funcs
+
+        deleted_funcs = []
+
+        for start in sorted(self.deleted_funcs):
+
+            func_o = ida_funcs.get_func(start)
+
+            if (func_o == None or func_o.start_ea != start):
+                deleted_funcs.append(start)
+
+        results["deleted_funcs"] = deleted_funcs
+
+        data = []
+
+        for ea in sorted(self.data):
+
+            flags = ida_bytes.get_flags(ea)
+
+            if (not ida_bytes.is_data(flags) or ida_bytes.get_item_head(ea) != ea):
+                continue
+
+            size = ida_bytes.get_item_size(ea)
+
+            if (ida_bytes.is_struct(flags)):
+                data.append([ea, size, "struct", idc.get_struc_name(self.data[ea])])
+            elif (ida_bytes.is_strlit(flags)):
+                data.append([ea, size, "strlit", ida_nalt.get_str_type(ea)])
+            else:
+                data.append([ea, size, "data", flags & ida_bytes.DT_TYPE])
+
+        results["data"] = data
+
+        names = []
+
+        for ea in sorted(self.names):
+
+            if (ida_bytes.has_user_name(ida_bytes.get_flags(ea))):
+                names.append([ea, ida_name.get_name(ea)])
+
+        results["names"] = names
+
+        cmts = []
+
+        for ea, repeatable in sorted(self.cmts):
+
+            cmt = idc.get_cmt(ea, repeatable)
+
+            if (cmt):
+                cmts.append([ea, repeatable, cmt])
+
+        results["cmts"] = cmts
+
+        func_cmts = []
+
+        for ea, repeatable in sorted(self.func_cmts):
+
+            cmt = idc.get_func_cmt(ea, repeatable)
+
+            if (cmt):
+                func_cmts.append([ea, repeatable, cmt])
+
+        results["func_cmts"] = func_cmts
+
+        results["xrefs"] = self.xrefs
+
+        results["info"] = [[key, shannon_generic.get_image_info(key)] for key in sorted(self.info)]
+
+        return results
+
+    # write the results and patched bytes to the store, atomically
+    def dump(self, image_hash):
+
+        store_path = get_store_path(image_hash)
+        tmp_path = store_path + ".%d.tmp" % os.getpid()
+
+        os.makedirs(tmp_path, exist_ok=True)
+
+        results = self.collect()
+
+        patches = []
+        patch_offset = 0
+
+        with open(os.path.join(tmp_path, PATCHES_FILE), "wb") as f:
+
+            for ea, size in self.patches:
+
+                written = 0
+
+                while (written < size):
+
+                    chunk = ida_bytes.get_bytes(ea + written, min(PATCH_CHUNK_SIZE, size - written))
+
+                    if (chunk == None):
+                        break
+
+                    f.write(chunk)
+                    written += len(chunk)
+
+                if (written > 0):
+                    patches.append([ea, patch_offset, written])
+                    patch_offset += written
+
+        results["patches"] = patches
+
+        with open(os.path.join(tmp_path, RESULTS_FILE), "w") as f:
+            json.dump(results, f)
+
+        shutil.rmtree(store_path, ignore_errors=True)
+        os.replace(tmp_path, store_path)
+
+        idc.msg("[i] stored post-processing results for %s (%d names, %d comments, %d segments)\n" %
+                (image_hash, len(results["names"]), len(results["cmts"]) + len(results["func_cmts"]),
+                 len(results["segments"])))
+
+# start recording the post-processing results
+def start_recording():
+
+    global recorder
+
+    if (not is_enabled()):
+        return
+
+    recorder = result_recorder_t()
+    recorder.hook()
+
+# stop recording and store the results
+def stop_recording():
+
+    global recorder
+
+    if (recorder == None):
+        return
+
+    recorder.unhook()
+
+    image_hash = get_image_hash()
+
+    if (image_hash != None):
+        try:
+            recorder.dump(image_hash)
+        except OSError as e:
+            idc.msg("[e] failed to store post-processing results: %s\n" % e)
+
+    recorder = None
+
+# load stored results for the current image, None if there are none
+def load_results():
+
+    if (not is_enabled()):
+        return None
+
+    image_hash = get_image_hash()
+
+    if (image_hash == None):
+        return None
+
+    results_path = os.path.join(get_store_path(image_hash), RESULTS_FILE)
+
+    if (not os.path.exists(results_path)):
+        return None
+
+    with open(results_path) as f:
+        results = json.load(f)
+
+    if (results.get("version") != CACHE_VERSION):
+        idc.msg("[i] stored post-processing results are outdated, ignoring them\n")
+        return None
+
+    results["path"] = get_store_path(image_hash)
+
+    return results
+
+# apply stored results in one pass, ordered so every step finds what it depends on
+def replay(results):
+
+    idc.msg("[i] replaying stored post-processing results from %s\n" % results["path"])
+
+    for start, end, name, sclass, stype, perm in results["segments"]:
+
+        idc.add_segm_ex(start, end, 0, 1, idaapi.saRel32Bytes, idaapi.scPub, ida_segment.ADDSEG_SPARSE)
+        idc.set_segm_class(start, sclass)
+        idc.set_segm_type(start, stype)
+        idc.set_segm_attr(start, idc.SEGATTR_PERM, perm)
+        idc.set_segm_name(start, name)
+
+    with open(os.path.join(results["path"], PATCHES_FILE), "rb") as f:
+
+        for ea, offset, size in results["patches"]:
+
+            f.seek(offset)
+
+            for pos in range(0, size, PATCH_CHUNK_SIZE):
+                ida_bytes.put_bytes(ea + pos, f.read(min(PATCH_CHUNK_SIZE, size - pos)))
+
+            shannon_strings.invalidate(ea, ea + size)
+
+    # functions the auto analysis created again but the post-processor removed
+    for start in results["deleted_funcs"]:
+
+        func_o = ida_funcs.get_func(start)
+
+        if (func_o != None and func_o.start_ea == start):
+            ida_funcs.del_func(start)
+
+    for start, end in results["funcs"]:
+
+        func_o = ida_funcs.get_func(start)
+
+        if (func_o != None and func_o.start_ea == start):
+            if (func_o.end_ea != end):
+                ida_funcs.set_func_end(start, end)
+        else:
+            ida_funcs.add_func(start, end)
+
+    for ea, size, kind, info in results["data"]:
+
+        ida_bytes.del_items(ea, 0, size)
+
+        if (kind == "struct"):
+            ida_bytes.create_struct(ea, size, idc.get_struc_id(info))
+        elif (kind == "strlit"):
+            ida_bytes.create_strlit(ea, size, info)
+        else:
+            ida_bytes.create_data(ea, info, size, idaapi.BADADDR)
+
+    for ea, name in results["names"]:
+        ida_name.set_name(ea, name, ida_name.SN_NOCHECK | ida_name.SN_FORCE)
+
+    for ea, repeatable, cmt in results["cmts"]:
+        idc.set_cmt(ea, cmt, repeatable)
+
+    for ea, repeatable, cmt in results["func_cmts"]:
+        idc.set_func_cmt(ea, cmt, repeatable)
+
+    for frm, to, xref_type in results["xrefs"]:
+        idc.add_dref(frm, to, xref_type)
+
+    for key, value in results["info"]:
+        shannon_generic.set_image_info(key, value)
+
+    idc.msg("[i] replayed %d names, %d comments, %d segments, %d patches\n" %
+            (len(results["names"]), len(results["cmts"]) + len(results["func_cmts"]),
+             len(results["segments"]), len(results["patches"])))
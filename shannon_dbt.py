@@ -0,0 +1,950 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - Debug Trace Records
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# This module does not depend on IDA. DBT records are the debug trace descriptors
+# of the modem, each one starts with a "DBT" head followed by a type byte. The
+# locator runs over the mapped segments of a ShannonImage in a single pass, which
+# is a lot cheaper than going through the string list of the database.
+
+# All records are decoded into a columnar TraceIndex which can be queried by file,
+# group or message and exported to SQLite or CSV for triage tooling.
+
+# The records are the format strings of the DM trace log. decode_log() renders a
+# raw DM log capture with them, streaming and in constant memory.
+
+import argparse
+import csv
+import functools
+import os
+import re
+import sqlite3
+import struct
+import sys
+import time
+
+import shannon_image
+
+# head of a record with a string reference, the type byte is ':'
+DBT_MAGIC = b"DBT:"
+
+dbt_re = re.compile(re.escape(DBT_MAGIC))
+
+# dbg_trace struct: head, group, channel, num_param, msg_ptr, line, file
+DBT_RECORD = struct.Struct("<IIIIIII")
+
+SQLITE_MAGIC = b"SQLite format 3\x00"
+
+COLUMNS = ["address", "head", "group", "channel", "num_param", "msg", "line", "file"]
+
+# DM trace frame as captured from the diag interface, all little endian:
+# 0x7F | payload length (u16) | DBT record address (u32) | arguments (u32 each) | 0x7E
+DM_START = 0x7F
+DM_END = 0x7E
+DM_HEADER = struct.Struct("<BHI")
+
+DM_CHUNK_SIZE = 0x100000
+
+# longest frame, start byte, u16 payload length and end byte
+DM_MAX_FRAME = 3 + 0xFFFF + 1
+
+# printf conversion specifiers as used by the modem
+format_re = re.compile(r"%([-+ #0]*)(\*|\d+)?(?:\.(\*|\d+))?(hh|h|ll|l|j|z|t|L)?([diouxXeEfgGcspn%])")
+
+# load addresses of all DBT records of a segment view
+def find_records_in(view, address):
+    return [address + match.start() for match in dbt_re.finditer(view)]
+
+# load addresses of all DBT records in the mapped segments of an image, in one pass each
+def find_records(image):
+
+    records = []
+
+    for entry in image.segments():
+        records += find_records_in(image.segment(entry), entry.address)
+
+    return records
+
+class TraceIndex:
+
+    def __init__(self):
+
+        self.address = []
+        self.head = []
+        self.group = []
+        self.channel = []
+        self.num_param = []
+        self.msg = []
+        self.line = []
+        self.file = []
+
+        # functions referencing a record, only known inside of IDA
+        self.funcs = []
+
+        self._by_file = None
+        self._by_group = None
+
+    def __len__(self):
+        return len(self.address)
+
+    # decode all records at once, read(ea, size) returns bytes and read_string(ea) a str or None
+    @classmethod
+    def build(cls, addresses, read, read_string):
+
+        index = cls()
+
+        valid = []
+        chunks = []
+
+        # one read per record, records cut off at the end of a segment are dropped
+        for ea in addresses:
+
+            chunk = read(ea, DBT_RECORD.size)
+
+            if (chunk != None and len(chunk) == DBT_RECORD.size):
+                valid.append(ea)
+                chunks.append(chunk)
+
+        buffer = b"".join(chunks)
+
+        # the same source file is referenced by thousands of records
+        strings = {}
+
+        def lookup(ea):
+
+            if (ea not in strings):
+                strings[ea] = read_string(ea)
+
+            return strings[ea]
+
+        for ea, record in zip(valid, DBT_RECORD.iter_unpack(buffer)):
+
+            head, group, channel, num_param, msg_ptr, line, file_ptr = record
+
+            index.append(ea, head, group, channel, num_param, lookup(msg_ptr), line, lookup(file_ptr), [])
+
+        return index
+
+    # index of an image outside of IDA, without referencing functions
+    @classmethod
+    def from_image(cls, image):
+
+        def read(ea, size):
+
+            entry = image.entry_by_address(ea)
+
+            if (entry == None):
+                return None
+
+            offset = entry.offset + (ea - entry.address)
+
+            return bytes(image.view[offset:min(offset + size, entry.offset + entry.size)])
+
+        def read_string(ea):
+
+            text = image.read_cstring(ea)
+
+            if (text == None):
+                return None
+
+            return text.decode("ascii", "replace")
+
+        return cls.build(find_records(image), read, read_string)
+
+    def append(self, address, head, group, channel, num_param, msg, line, file, funcs):
+
+        self.address.append(address)
+        self.head.append(head)
+        self.group.append(group)
+        self.channel.append(channel)
+        self.num_param.append(num_param)
+        self.msg.append(msg)
+        self.line.append(line)
+        self.file.append(file)
+        self.funcs.append(funcs)
+
+        self._by_file = None
+        self._by_group = None
+
+    def row(self, i):
+        return (self.address[i], self.head[i], self.group[i], self.channel[i], self.num_param[i],
+                self.msg[i], self.line[i], self.file[i])
+
+    def rows(self, selection=None):
+
+        if (selection == None):
+            selection = range(len(self))
+
+        return [self.row(i) for i in selection]
+
+    # rows of a source file, the file name is matched against the end of the path
+    def by_file(self, name):
+
+        if (self._by_file == None):
+
+            self._by_file = {}
+
+            for i, file in enumerate(self.file):
+                self._by_file.setdefault(file, []).append(i)
+
+        selection = []
+
+        for file, rows in self._by_file.items():
+            if (file != None and (file == name or file.endswith("/" + name) or file.endswith("\\" + name))):
+                selection += rows
+
+        return sorted(selection)
+
+    def by_group(self, group):
+
+        if (self._by_group == None):
+
+            self._by_group = {}
+
+            for i, value in enumerate(self.group):
+                self._by_group.setdefault(value, []).append(i)
+
+        return self._by_group.get(group, [])
+
+    def search(self, text):
+        return [i for i, msg in enumerate(self.msg) if msg != None and text in msg]
+
+    # source file -> functions and function -> source files, by number of trace sites
+    def module_map(self):
+
+        file_funcs = {}
+        func_files = {}
+
+        for file, funcs in zip(self.file, self.funcs):
+
+            if (file == None):
+                continue
+
+            file = normalize_path(file)
+
+            for func in funcs:
+
+                counts = file_funcs.setdefault(file, {})
+                counts[func] = counts.get(func, 0) + 1
+
+                counts = func_files.setdefault(func, {})
+                counts[file] = counts.get(file, 0) + 1
+
+        return file_funcs, func_files
+
+    # the source file with the most trace sites of every function
+    def primary_files(self):
+
+        file_funcs, func_files = self.module_map()
+
+        return {func: max(sorted(files), key=files.get) for func, files in func_files.items()}
+
+    def export_csv(self, path):
+
+        with open(path, "w", newline="") as f:
+
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS + ["funcs"])
+
+            for i in range(len(self)):
+                writer.writerow(list(self.row(i)) + [";".join("%x" % ea for ea in self.funcs[i])])
+
+    def export_sqlite(self, path):
+
+        db = sqlite3.connect(path)
+
+        try:
+            db.execute("DROP TABLE IF EXISTS traces")
+            db.execute("DROP TABLE IF EXISTS refs")
+            db.execute("CREATE TABLE traces (address INTEGER PRIMARY KEY, head INTEGER, grp INTEGER, "
+                       "channel INTEGER, num_param INTEGER, msg TEXT, line INTEGER, file TEXT)")
+            db.execute("CREATE TABLE refs (address INTEGER, func INTEGER)")
+
+            db.executemany("INSERT OR REPLACE INTO traces VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self.rows())
+            db.executemany("INSERT INTO refs VALUES (?, ?)",
+                           [(ea, func) for ea, funcs in zip(self.address, self.funcs) for func in funcs])
+
+            db.execute("CREATE INDEX traces_file ON traces (file)")
+            db.execute("CREATE INDEX traces_grp ON traces (grp)")
+
+            db.commit()
+
+        finally:
+            db.close()
+
+    @classmethod
+    def load_sqlite(cls, path):
+
+        index = cls()
+        funcs = {}
+
+        db = sqlite3.connect(path)
+
+        try:
+            for address, func in db.execute("SELECT address, func FROM refs"):
+                funcs.setdefault(address, []).append(func)
+
+            for row in db.execute("SELECT * FROM traces ORDER BY address"):
+                index.append(*row, funcs.get(row[0], []))
+
+        finally:
+            db.close()
+
+        return index
+
+# build paths come from different hosts, turn them into a clean relative path
+def normalize_path(path):
+
+    parts = []
+
+    for part in path.replace("\\", "/").split("/"):
+
+        if (part in ("", ".", "..") or part.endswith(":")):
+            continue
+
+        parts.append(part)
+
+    return "/".join(parts)
+
+# SQLite export of an image in the cache, the post-processor writes the same file
+def index_cache_path(image):
+    return os.path.join(shannon_image.cache_dir(), "traces", image.sha256("MAIN") + ".sqlite")
+
+# open an index from a SQLite export or an image, the index of an image is cached
+def open_index(path):
+
+    with open(path, "rb") as f:
+        header = f.read(len(SQLITE_MAGIC))
+
+    if (header == SQLITE_MAGIC):
+        return TraceIndex.load_sqlite(path)
+
+    with shannon_image.open_image(path) as image:
+
+        cache_path = index_cache_path(image)
+
+        if (os.path.exists(cache_path)):
+            return TraceIndex.load_sqlite(cache_path)
+
+        index = TraceIndex.from_image(image)
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    index.export_sqlite(cache_path)
+
+    return index
+
+# split a format string into literals and conversion specs, parsed once per unique string.
+# A spec is a tuple of (flags, width, precision, length, conversion).
+@functools.lru_cache(maxsize=None)
+def parse_format(fmt):
+
+    tokens = []
+    pos = 0
+
+    for match in format_re.finditer(fmt):
+
+        if (match.start() > pos):
+            tokens.append(fmt[pos:match.start()])
+
+        if (match.group(5) == "%"):
+            tokens.append("%")
+        else:
+            tokens.append(match.groups(""))
+
+        pos = match.end()
+
+    if (pos < len(fmt)):
+        tokens.append(fmt[pos:])
+
+    return tuple(tokens)
+
+# C types of the trace arguments, every argument is passed as a raw 32 bit word
+ARG_TYPES = {
+    "d": "int", "i": "int",
+    "o": "unsigned int", "u": "unsigned int", "x": "unsigned int", "X": "unsigned int",
+    "c": "char",
+    "s": "char *",
+    "p": "void *",
+    "n": "int *",
+}
+
+# C types of the 64 bit arguments, long long and the double a variadic float is promoted to
+WIDE_ARG_TYPES = {
+    "d": "long long", "i": "long long",
+    "o": "unsigned long long", "u": "unsigned long long", "x": "unsigned long long",
+    "X": "unsigned long long",
+    "e": "double", "E": "double", "f": "double", "g": "double", "G": "double",
+}
+
+def is_wide(length, conv):
+    return (conv in "eEfgG" or (length in ("ll", "j") and conv in "diouxX"))
+
+# (specifier, C type, word, wide) of every argument of a format string, parsed once per
+# unique string. Word 0 is R1, the DBT record is passed in R0. AAPCS passes 64 bit
+# values in two words starting at an even register or stack slot, the skipped word
+# stays in the frame
+@functools.lru_cache(maxsize=None)
+def arg_types(fmt):
+
+    types = []
+    word = 0
+
+    for token in parse_format(fmt):
+
+        if (isinstance(token, str)):
+            continue
+
+        flags, width, precision, length, conv = token
+
+        if (width == "*"):
+            types.append(("*", "int", word, False))
+            word += 1
+
+        if (precision == "*"):
+            types.append((".*", "int", word, False))
+            word += 1
+
+        spec = "%" + flags + width + ("." + precision if precision else "") + length + conv
+
+        if (is_wide(length, conv)):
+
+            if (word % 2 == 0):
+                word += 1
+
+            types.append((spec, WIDE_ARG_TYPES[conv], word, True))
+            word += 2
+
+        else:
+            types.append((spec, ARG_TYPES.get(conv, "unsigned int"), word, False))
+            word += 1
+
+    return tuple(types)
+
+# number of 32 bit words the arguments of a format string take
+def count_args(fmt):
+
+    types = arg_types(fmt)
+
+    if (len(types) == 0):
+        return 0
+
+    spec, c_type, word, wide = types[-1]
+
+    return word + (2 if wide else 1)
+
+# location of a trace argument, the DBT record is passed in R0
+def arg_location(arg):
+
+    if (arg < 3):
+        return "R%d" % (arg + 1)
+
+    return "[SP+0x%x]" % ((arg - 3) * 4)
+
+def to_signed(value):
+    return value - 0x100000000 if value & 0x80000000 else value
+
+def to_signed64(value):
+    return value - 0x10000000000000000 if value & 0x8000000000000000 else value
+
+def to_char(value):
+    return chr(value & 0xFF)
+
+def to_double(value):
+    return struct.unpack("<d", struct.pack("<Q", value))[0]
+
+# strings are pointers into the modem memory, they are printed as such
+def to_pointer(value):
+    return "0x%08x" % value
+
+# translate a format string into a python format string and a (word, wide, converter)
+# slot per rendered argument, compiled once per unique string. The slots are None if
+# the raw words can be passed as they are
+@functools.lru_cache(maxsize=None)
+def compile_format(fmt):
+
+    pyfmt = []
+    slots = []
+
+    types = iter(arg_types(fmt))
+
+    for token in parse_format(fmt):
+
+        if (isinstance(token, str)):
+            pyfmt.append(token.replace("%", "%%"))
+            continue
+
+        flags, width, precision, length, conv = token
+
+        if (width == "*"):
+            slots.append((next(types)[2], False, to_signed))
+
+        if (precision == "*"):
+
+            word = next(types)[2]
+
+            # strings are printed as pointers, their precision does not apply
+            if (conv not in "spn"):
+                slots.append((word, False, None))
+
+        spec, c_type, word, wide = next(types)
+        spec = "%" + flags + width + ("." + precision if precision else "")
+
+        if (conv in "di"):
+            pyfmt.append(spec + "d")
+            slots.append((word, wide, to_signed64 if wide else to_signed))
+        elif (conv in "ouxX"):
+            pyfmt.append(spec + conv)
+            slots.append((word, wide, None))
+        elif (conv == "c"):
+            pyfmt.append(spec + "c")
+            slots.append((word, wide, to_char))
+        elif (conv in "eEfgG"):
+            pyfmt.append(spec + conv)
+            slots.append((word, wide, to_double))
+        elif (flags == "" and width == ""):
+            # the same text as to_pointer() without a conversion
+            pyfmt.append("%#010x")
+            slots.append((word, wide, None))
+        else:
+            pyfmt.append("%" + flags + width + "s")
+            slots.append((word, wide, to_pointer))
+
+    if (all(slot == (n, False, None) for n, slot in enumerate(slots))):
+        slots = None
+
+    return "".join(pyfmt), slots, count_args(fmt)
+
+# struct codes of the slot conversions. The raw words of a trace are packed and read
+# back in one unpack with the signedness and width the format asks for
+NARROW_CODES = {None: "I", to_signed: "i", to_char: "B3x"}
+WIDE_CODES = {None: "Q", to_signed64: "q", to_double: "d"}
+
+# struct format reading the rendered values from the packed words, None if a slot has no code
+def slot_struct(slots, nargs):
+
+    codes = ["<"]
+    pos = 0
+
+    for word, wide, conv in slots:
+
+        code = (WIDE_CODES if wide else NARROW_CODES).get(conv)
+
+        # the words are in order, a word can only be rendered once
+        if (code == None or word < pos):
+            return None
+
+        codes.append("4x" * (word - pos) + code)
+        pos = word + (2 if wide else 1)
+
+    codes.append("4x" * (nargs - pos))
+
+    return struct.Struct("".join(codes))
+
+# renderer of a format string, a function of the raw 32 bit arguments of a trace. Built
+# once per unique string, it is called for every frame of the capture: constant strings
+# are rendered once, the arguments are converted by struct instead of per slot in python
+@functools.lru_cache(maxsize=None)
+def compile_renderer(fmt):
+
+    pyfmt, slots, nargs = compile_format(fmt)
+
+    if (nargs == 0):
+        text = pyfmt % ()
+        return lambda args: text
+
+    # short frames are padded, surplus arguments are ignored
+    padding = (0,) * nargs
+
+    if (slots == None):
+
+        def render(args):
+
+            if (len(args) != nargs):
+                args = (args + padding)[:nargs]
+
+            return pyfmt % args
+
+        return render
+
+    values = slot_struct(slots, nargs)
+
+    if (values != None):
+
+        pack = struct.Struct("<%dI" % nargs).pack
+        unpack = values.unpack
+
+        def render(args):
+
+            if (len(args) != nargs):
+                args = (args + padding)[:nargs]
+
+            return pyfmt % unpack(pack(*args))
+
+        return render
+
+    def render(args):
+
+        if (len(args) != nargs):
+            args = (args + padding)[:nargs]
+
+        values = []
+
+        for word, wide, conv in slots:
+
+            value = args[word]
+
+            if (wide):
+                value |= args[word + 1] << 32
+
+            values.append(value if conv == None else conv(value))
+
+        return pyfmt % tuple(values)
+
+    return render
+
+# render a format string with the raw 32 bit arguments of a trace
+def format_trace(fmt, args):
+    return compile_renderer(fmt)(args)
+
+# trace id (the DBT record address) to format, file and line, the decoder only needs this
+def build_lookup(index):
+
+    lookup = {}
+
+    for i in range(len(index)):
+        lookup[index.address[i]] = (index.msg[i] or "", index.file[i] or "?", index.line[i])
+
+    return lookup
+
+# decode a DM log lazily, yields (trace, args) per trace frame with the (format, file,
+# line) tuple of the lookup and the raw 32 bit arguments, render_trace() formats them.
+# The capture is read into a fixed buffer, only the incomplete tail of a chunk is moved
+# to its start. The counters are flushed into stats after every chunk.
+def decode_log(fin, lookup, stats=None):
+
+    if (stats == None):
+        stats = {}
+
+    stats.update({"frames": 0, "broken": 0, "unknown": 0, "format_errors": 0})
+
+    frames = 0
+    broken = 0
+    unknown = 0
+
+    # payload length -> argument unpacker
+    arg_unpackers = {}
+
+    # bound once, this loop runs for every frame of multi GB captures
+    unpack_header = DM_HEADER.unpack_from
+    header_size = DM_HEADER.size
+    get_trace = lookup.get
+    get_unpacker = arg_unpackers.get
+
+    buffer = bytearray(DM_CHUNK_SIZE + DM_MAX_FRAME)
+    view = memoryview(buffer)
+    find = buffer.find
+
+    filled = 0
+    pos = 0
+
+    eof = False
+
+    while (not eof):
+
+        tail = filled - pos
+        buffer[:tail] = view[pos:filled]
+
+        read = fin.readinto(view[tail:tail + DM_CHUNK_SIZE])
+
+        # the tail is scanned once more at the end of the capture, a frame which cannot
+        # be completed any more is broken and the scan resyncs behind its start
+        eof = (not read)
+
+        filled = tail + (read or 0)
+        pos = 0
+
+        while (True):
+
+            # frames usually follow each other, the search is only needed after junk
+            if (pos >= filled or buffer[pos] != DM_START):
+
+                pos = find(DM_START, pos, filled)
+
+                if (pos < 0):
+                    pos = filled
+                    break
+
+            if (pos + header_size > filled):
+
+                if (not eof):
+                    break
+
+                broken += 1
+                pos += 1
+                continue
+
+            start, length, trace_id = unpack_header(buffer, pos)
+
+            end = pos + 3 + length
+
+            # resync on broken frames
+            if (end >= filled):
+
+                if (not eof):
+                    break
+
+                broken += 1
+                pos += 1
+                continue
+
+            if (length < 4 or buffer[end] != DM_END):
+                broken += 1
+                pos += 1
+                continue
+
+            frames += 1
+
+            trace = get_trace(trace_id)
+
+            if (trace == None):
+                unknown += 1
+                pos = end + 1
+                continue
+
+            unpacker = get_unpacker(length)
+
+            if (unpacker == None):
+                unpacker = arg_unpackers[length] = struct.Struct("<%dI" % ((length - 4) // 4)).unpack_from
+
+            args = unpacker(buffer, pos + header_size)
+
+            pos = end + 1
+
+            yield trace, args
+
+        stats.update({"frames": frames, "broken": broken, "unknown": unknown})
+
+# render a decoded frame as (file, line, message). A format the renderer cannot handle
+# must not end the decoding, it is counted and printed with its raw arguments
+def render_trace(trace, args, stats):
+
+    fmt, file, line = trace
+
+    try:
+        return file, line, compile_renderer(fmt)(args)
+    except (TypeError, ValueError, OverflowError):
+        stats["format_errors"] += 1
+        return file, line, "%s %s" % (fmt, " ".join("%x" % arg for arg in args))
+
+def cmd_find(args):
+
+    with shannon_image.open_image(args.image) as image:
+
+        start_time = time.process_time()
+        records = find_records(image)
+        runtime = time.process_time() - start_time
+
+    for ea in records[:args.limit]:
+        print("%x" % ea)
+
+    print("[i] found %d DBT records in %.3f seconds" % (len(records), runtime))
+
+def cmd_query(args):
+
+    start_time = time.process_time()
+    index = open_index(args.index)
+    build_time = time.process_time() - start_time
+
+    start_time = time.process_time()
+
+    selection = range(len(index))
+
+    if (args.file != None):
+        selection = sorted(set(selection) & set(index.by_file(args.file)))
+
+    if (args.group != None):
+        selection = sorted(set(selection) & set(index.by_group(args.group)))
+
+    if (args.search != None):
+        selection = sorted(set(selection) & set(index.search(args.search)))
+
+    query_time = time.process_time() - start_time
+
+    for i in selection[:args.limit] if args.limit else selection:
+
+        address, head, group, channel, num_param, msg, line, file = index.row(i)
+        funcs = " ".join("%x" % ea for ea in index.funcs[i])
+
+        print("%x %x %d %s:%d %s %s" % (address, group, channel, file, line, repr(msg), funcs))
+
+    if (args.csv != None):
+        index.export_csv(args.csv)
+        print("[i] wrote %s" % args.csv)
+
+    if (args.sqlite != None):
+        index.export_sqlite(args.sqlite)
+        print("[i] wrote %s" % args.sqlite)
+
+    print("[i] %d of %d records, index %.3f seconds, query %.3f seconds" %
+          (len(selection), len(index), build_time, query_time))
+
+def cmd_decode(args):
+
+    lookup = build_lookup(open_index(args.index))
+
+    stats = {}
+    count = 0
+
+    start_time = time.time()
+
+    write = sys.stdout.write
+
+    with open(args.log, "rb") as fin:
+
+        for trace, trace_args in decode_log(fin, lookup, stats):
+
+            # only printed traces are formatted
+            if (not args.quiet):
+                write("%s:%d: %s\n" % render_trace(trace, trace_args, stats))
+
+            count += 1
+
+    runtime = time.time() - start_time
+    size = os.path.getsize(args.log)
+
+    print("[i] decoded %d traces, %d unknown ids, %d broken frames, %d format errors, %.1f MB/s" %
+          (count, stats["unknown"], stats["broken"], stats["format_errors"],
+           size / max(runtime, 1e-6) / 0x100000), file=sys.stderr)
+
+# DM frame of a trace id and its 32 bit arguments
+def dm_frame(trace_id, args):
+    return (DM_HEADER.pack(DM_START, 4 + 4 * len(args), trace_id) +
+            struct.pack("<%dI" % len(args), *args) + bytes([DM_END]))
+
+# capture reader which returns at most size bytes per read, frames are split at every offset
+class ShortReader:
+
+    def __init__(self, data, size):
+
+        self.data = data
+        self.size = size
+        self.pos = 0
+
+    def readinto(self, buffer):
+
+        chunk = self.data[self.pos:self.pos + min(self.size, len(buffer))]
+        buffer[:len(chunk)] = chunk
+        self.pos += len(chunk)
+
+        return len(chunk)
+
+# decoder self check on a synthetic capture: junk, a frame with an unknown id, a frame
+# which is cut by the end of the capture and a frame header with its length past the end
+def cmd_check(args):
+
+    lookup = {
+        0x40001000: ("state %d -> %d", "rrc.c", 10),
+        0x40002000: ("%s rx %llu bytes", "mac.c", 20),
+        0x40003000: ("%c%c: 100%%", "nas.c", 30),
+    }
+
+    capture = (b"\x00\x7e\x01" +
+               dm_frame(0x40001000, (1, 0xFFFFFFFE)) +
+               dm_frame(0x40002000, (0x41000000, 0x89ABCDEF, 0x1)) +
+               dm_frame(0x40009000, (7,)) +
+               b"\x7f\x01\x00" +
+               dm_frame(0x40003000, (0x4C, 0x54, 0x45)) +
+               b"\x7f\xff\xff" +
+               dm_frame(0x40001000, (2,)) +
+               dm_frame(0x40001000, (3, 4))[:-1])
+
+    expected = [
+        ("rrc.c", 10, "state 1 -> -2"),
+        ("mac.c", 20, "0x41000000 rx 6604705263 bytes"),
+        ("nas.c", 30, "LT: 100%"),
+        ("rrc.c", 10, "state 2 -> 0"),
+    ]
+
+    expected_stats = {"frames": 5, "broken": 3, "unknown": 1, "format_errors": 0}
+
+    failed = 0
+
+    for size in range(1, len(capture) + 1):
+
+        stats = {}
+        traces = [render_trace(trace, trace_args, stats)
+                  for trace, trace_args in decode_log(ShortReader(capture, size), lookup, stats)]
+
+        if (traces != expected or stats != expected_stats):
+            print("[e] reads of %d bytes: %s %s" % (size, traces, stats))
+            failed += 1
+
+    if (failed > 0):
+        print("[e] decoder check failed for %d read sizes" % failed)
+        return 1
+
+    print("[i] decoder check passed for %d read sizes" % len(capture))
+
+    return 0
+
+def cmd_modules(args):
+
+    index = open_index(args.index)
+
+    file_funcs, func_files = index.module_map()
+
+    if (len(func_files) == 0):
+        print("[e] the index has no function references, use the SQLite export of the post-processor")
+        return
+
+    for file in sorted(file_funcs):
+
+        if (args.file != None and not file.endswith(args.file)):
+            continue
+
+        print("%s: %s" % (file, " ".join("%x" % ea for ea in sorted(file_funcs[file]))))
+
+    print("[i] %d source files, %d functions" % (len(file_funcs), len(func_files)))
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Shannon modem debug trace tool")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    find = sub.add_parser("find", help="locate the DBT records of an image")
+    find.add_argument("image")
+    find.add_argument("--limit", type=int, default=0, help="print the first addresses")
+    find.set_defaults(func=cmd_find)
+
+    query = sub.add_parser("query", help="query the trace index of an image or SQLite export")
+    query.add_argument("index", help="modem image or SQLite export")
+    query.add_argument("--file", help="source file name")
+    query.add_argument("--group", type=lambda x: int(x, 0), help="trace group")
+    query.add_argument("--search", help="message substring")
+    query.add_argument("--limit", type=int, default=0)
+    query.add_argument("--csv", help="export the whole index as CSV")
+    query.add_argument("--sqlite", help="export the whole index as SQLite")
+    query.set_defaults(func=cmd_query)
+
+    modules = sub.add_parser("modules", help="list the functions of every source file")
+    modules.add_argument("index", help="SQLite export of the post-processor")
+    modules.add_argument("--file", help="only source files ending with this")
+    modules.set_defaults(func=cmd_modules)
+
+    decode = sub.add_parser("decode", help="render a raw DM trace log")
+    decode.add_argument("index", help="modem image or SQLite export")
+    decode.add_argument("log")
+    decode.add_argument("-q", "--quiet", action="store_true", help="only report the statistics")
+    decode.set_defaults(func=cmd_decode)
+
+    check = sub.add_parser("check", help="run the DM decoder on a synthetic capture")
+    check.set_defaults(func=cmd_check)
+
+    args = parser.parse_args(argv)
+
+    return args.func(args) or 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,55 +9,267 @@ import ida_bytes
 import ida_nalt
 import idautils
 import idaapi
+import ida_dirtree
+import ida_funcs
+import ida_typeinf
 
 import os
-import shannon_structs
+import sqlite3
+
+import shannon_dbt
+import shannon_cache
+import shannon_image
+
+# index of all dbg_trace records in the database, kept for the session
+trace_index = None
+
+def read_string(ea):
+
+    # creating is mostly not needed but we do it to make sure it is defined
+    ida_bytes.create_strlit(ea, 0, ida_nalt.STRTYPE_C)
+    text = idc.get_strlit_contents(ea)
+
+    if (text == None):
+        return None
+
+    return text.decode("utf-8", "replace")
+
+# decode all dbg_trace structs of the database into a columnar index
+def build_index():
+
+    struct_id = idc.get_struc_id("dbg_trace")
+
+    addresses = [xref.frm for xref in idautils.XrefsTo(struct_id, 0)]
+
+    return shannon_dbt.TraceIndex.build(addresses, ida_bytes.get_bytes, read_string)
+
+def get_index():
+
+    global trace_index
+
+    if (trace_index == None):
+        trace_index = build_index()
+
+    return trace_index
+
+# the index is stored next to the post-processing results, triage tools query it with shannon_dbt.py
+def export_index(index):
+
+    image_hash = shannon_cache.get_image_hash()
+
+    if (image_hash == None):
+        return
+
+    export_path = os.path.join(shannon_image.cache_dir(), "traces", image_hash + ".sqlite")
+
+    os.makedirs(os.path.dirname(export_path), exist_ok=True)
+
+    try:
+        index.export_sqlite(export_path)
+        idc.msg("[i] trace index with %d records written to %s\n" % (len(index), export_path))
+    except (OSError, sqlite3.Error) as e:
+        idc.msg("[e] failed to write trace index: %s\n" % e)
 
 # this creates cmts from previously created dbt structures to anote
-# functions with their source paths and string refs
+# functions with their source paths and string refs. All comments are gathered
+# and de-duplicated first, a function gets all of its source files in one comment.
 def make_dbt_refs():
 
     idc.msg("[i] creating dbt references\n")
 
-    struct_id = idc.get_struc_id("dbg_trace")
-    all_structs = idautils.XrefsTo(struct_id, 0)
-    
-    tif = shannon_structs.get_struct(struct_id)
-    
-    # moved out of the for loop for performance reasons
-    str_ptr = shannon_structs.get_offset_by_name(tif, "msg_ptr")
-    file_ptr = shannon_structs.get_offset_by_name(tif, "file")
-
-    for i in all_structs:
-       
-        str_offset = int.from_bytes(
-            ida_bytes.get_bytes((i.frm+str_ptr), 4), "little")
-        
-        # creating is mostly not needed but we do it to make sure it is defined
-        ida_bytes.create_strlit(str_offset, 0, ida_nalt.STRTYPE_C)
-        msg_str = idc.get_strlit_contents(str_offset)
-        
-        # shannon_generic.DEBUG("[d] make_dbt_refs() %x: %s\n" % (str_offset, msg_str))
-        file_offset = int.from_bytes(
-            ida_bytes.get_bytes((i.frm+file_ptr), 4), "little")
-        
-        ida_bytes.create_strlit(file_offset, 0, ida_nalt.STRTYPE_C)
-        file_str = idc.get_strlit_contents(file_offset)
-        
-        # shannon_generic.DEBUG("[d] make_dbt_refs() %x: %s\n" % (file_offset, file_str))
+    index = get_index()
+
+    cmts = {}
+    func_files = {}
+    xref_cnt = 0
+
+    for i in range(len(index)):
+
+        msg_str = index.msg[i]
+        file_str = index.file[i]
 
         # find xref to struct
-        for xref_dbt in idautils.XrefsTo(i.frm,  0):
-            if (msg_str != None):
-                idaapi.set_cmt(xref_dbt.frm, msg_str.decode(), 1)
+        for xref_dbt in idautils.XrefsTo(index.address[i], 0):
+
+            xref_cnt += 1
 
-                func_start = idc.get_func_attr(
-                    xref_dbt.frm, idc.FUNCATTR_START)
+            func_start = idc.get_func_attr(
+                xref_dbt.frm, idc.FUNCATTR_START)
+
+            if (func_start != idaapi.BADADDR and func_start not in index.funcs[i]):
+                index.funcs[i].append(func_start)
+
+            if (msg_str != None):
+                cmts[xref_dbt.frm] = msg_str
 
                 if (func_start != idaapi.BADADDR):
                     if (file_str != None):
-                        idaapi.set_func_cmt(
-                            func_start, file_str.decode(), 1)
+                        files = func_files.setdefault(func_start, [])
+
+                        if (file_str not in files):
+                            files.append(file_str)
+
+    writes = flush_cmts(cmts, func_files)
+
+    idc.msg("[i] %d dbt xrefs, %d comments, %d function comments, %d database writes\n" %
+            (xref_cnt, len(cmts), len(func_files), writes))
+
+    export_index(index)
+
+# write the gathered comments in one go, unchanged comments are not written again
+def flush_cmts(cmts, func_files):
+
+    writes = 0
+
+    for ea, cmt in cmts.items():
+
+        if (idc.get_cmt(ea, 1) != cmt):
+            idaapi.set_cmt(ea, cmt, 1)
+            writes += 1
+
+    for func_start, files in func_files.items():
+
+        cmt = "\n".join(files)
+
+        if (idc.get_func_cmt(func_start, 1) != cmt):
+            idaapi.set_func_cmt(func_start, cmt, 1)
+            writes += 1
+
+    return writes
+
+# functions referencing the records, make_dbt_refs collects these on its way
+def collect_funcs(index):
+
+    for i in range(len(index)):
+
+        for xref_dbt in idautils.XrefsTo(index.address[i], 0):
+
+            func_start = idc.get_func_attr(xref_dbt.frm, idc.FUNCATTR_START)
+
+            if (func_start != idaapi.BADADDR and func_start not in index.funcs[i]):
+                index.funcs[i].append(func_start)
+
+# sort all functions with trace sites into function folders named after their source
+# file, a function with several source files goes to the one with the most traces
+def make_module_folders():
+
+    idc.msg("[i] creating function folders from dbt source files\n")
+
+    index = get_index()
+
+    # the index was rebuilt, e.g. after replaying stored results
+    if (not any(index.funcs)):
+        collect_funcs(index)
+
+    func_dir = ida_dirtree.get_std_dirtree(ida_dirtree.DIRTREE_FUNCS)
+
+    folders = set()
+    moved = 0
+
+    for func_start, file in index.primary_files().items():
+
+        folder = "/" + file
+
+        # parents first, mkdir does not create them
+        if (folder not in folders):
+
+            parts = file.split("/")
+
+            for depth in range(1, len(parts) + 1):
+
+                parent = "/" + "/".join(parts[:depth])
+
+                if (parent not in folders):
+                    func_dir.mkdir(parent)
+                    folders.add(parent)
+
+        func_name = ida_funcs.get_func_name(func_start)
+
+        if (func_name == None):
+            continue
+
+        if (func_dir.rename(func_name, folder + "/" + func_name) == ida_dirtree.DTE_OK):
+            moved += 1
+
+    idc.msg("[i] moved %d functions into %d folders\n" % (moved, len(folders)))
+
+# find the call to dm_TraceMsg following the load of a DBT record
+def find_trace_call(ea, trace_func, max_insns=8):
+
+    for cnt in range(max_insns):
+
+        ea = idc.next_head(ea)
+
+        # exact match, BLS, BLT, BLE and BLO are conditional branches
+        if (idc.print_insn_mnem(ea) in ("BL", "BLX")):
+            return ea if (idc.get_operand_value(ea, 0) == trace_func) else None
+
+    return None
+
+# type every dm_TraceMsg call after the % specifiers of its format string, the
+# prototype of a format is built once and shared by all calls using it
+def type_trace_calls():
+
+    trace_func = idc.get_name_ea_simple("dm_TraceMsg")
+
+    if (trace_func == idaapi.BADADDR):
+        idc.msg("[i] dm_TraceMsg() not identified, skipping trace call typing\n")
+        return
+
+    idc.msg("[i] typing dm_TraceMsg() calls\n")
+
+    index = get_index()
+
+    prototypes = {}
+    calls = 0
+    writes = 0
+
+    for i in range(len(index)):
+
+        fmt = index.msg[i]
+
+        if (fmt == None):
+            continue
+
+        types = shannon_dbt.arg_types(fmt)
+
+        if (fmt not in prototypes):
+
+            args = ["void *trace"] + ["%s arg%d" % (c_type, n) for n, (spec, c_type, word, wide) in enumerate(types)]
+            decl = "void dm_TraceMsg(%s);" % ", ".join(args)
+
+            tif = ida_typeinf.tinfo_t()
+
+            if (ida_typeinf.parse_decl(tif, None, decl, ida_typeinf.PT_SIL) == None):
+                tif = None
+
+            cmt = " ".join("%s=%s" % (shannon_dbt.arg_location(word), spec) for spec, c_type, word, wide in types)
+
+            prototypes[fmt] = (tif, cmt)
+
+        tif, cmt = prototypes[fmt]
+
+        for xref_dbt in idautils.XrefsTo(index.address[i], 0):
+
+            if (not idc.is_code(idc.get_full_flags(xref_dbt.frm))):
+                continue
+
+            call_ea = find_trace_call(xref_dbt.frm, trace_func)
+
+            if (call_ea == None):
+                continue
+
+            calls += 1
+
+            if (tif != None and ida_typeinf.apply_callee_tinfo(call_ea, tif)):
+                writes += 1
+
+            if (cmt and idc.get_cmt(call_ea, 0) != cmt):
+                idc.set_cmt(call_ea, cmt, 0)
+                writes += 1
+
+    idc.msg("[i] typed %d dm_TraceMsg() calls with %d formats, %d database writes\n" %
+            (calls, len(prototypes), writes))
 
 #for debugging purpose export SHANNON_WORKFLOW="NO"
 if (os.environ.get('SHANNON_WORKFLOW') == "NO"):
@@ -0,0 +1,612 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - Scatter Decompression
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# This module does not depend on IDA. It decodes the LZ77 variant of the ARM linker
+# which is used for SCATCOMP regions. The compressed input is a single buffer which
+# is fetched once, literal runs and matches are copied with slice assignments. A
+# reference compressor for the same token format generates payloads for the round
+# trip fuzzing and the throughput benchmark, no firmware is needed for either.
+
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+# the last token may read this many bytes past the end of the region
+MAX_TOKEN_SIZE = 260
+
+# below this many compressed bytes in total starting the worker processes costs more
+# than it saves
+PARALLEL_MIN_SIZE = 0x40000
+
+# limits of the token format
+MAX_LITERALS = 255
+MAX_MATCH = 256
+MAX_DISTANCE = 0xFFFF
+
+# shortest match the compressor emits and match candidates it tries per position
+MIN_MATCH = 3
+MAX_CHAIN = 16
+
+# token layout, all counts are extended by an extra byte if their field is 0:
+#
+#   bits 0-1 literal count
+#   bits 2-3 high part of the match offset, 3 means an extra byte follows the offset
+#   bits 4-7 match length - 1
+#
+# followed by [literal count] [match length] literals [offset] [offset high]
+
+# decompress cnt bytes of compressed input from src, a bytes like object which holds
+# the region and up to MAX_TOKEN_SIZE bytes after it. The output is size bytes, the
+# region size by default, anything beyond is cut off like the firmware does. Raises a
+# ValueError if a match reaches before the output or the input ends within a token
+def decompress(src, cnt, size=None):
+
+    src = memoryview(src)
+    src_len = len(src)
+
+    if (size == None):
+        size = cnt
+
+    output_buffer = bytearray(size)
+
+    src_index = 0
+    dst_index = 0
+
+    try:
+
+        while (src_index < cnt):
+
+            cur_byte = src[src_index]
+            src_index += 1
+
+            cpy_bytes = cur_byte & 3
+
+            if (cpy_bytes == 0):
+                cpy_bytes = src[src_index]
+                src_index += 1
+
+            high_4_b = cur_byte >> 4
+
+            if (high_4_b == 0):
+                high_4_b = src[src_index]
+                src_index += 1
+
+            if (cpy_bytes):
+
+                end = dst_index + cpy_bytes
+
+                if (src_index + cpy_bytes > src_len):
+                    raise IndexError
+
+                # the output ends within the run
+                if (end > size):
+                    output_buffer[dst_index:size] = src[src_index:src_index + size - dst_index]
+                    return output_buffer
+
+                output_buffer[dst_index:end] = src[src_index:src_index + cpy_bytes]
+
+                dst_index = end
+                src_index += cpy_bytes
+
+            if (high_4_b):
+
+                bit_2_3 = cur_byte & 0xC
+
+                if (bit_2_3 == 0xC):
+                    src_ptr = dst_index - src[src_index] - 256 * src[src_index + 1]
+                    src_index += 2
+                else:
+                    src_ptr = dst_index - src[src_index] - 64 * bit_2_3
+                    src_index += 1
+
+                if (dst_index >= size):
+                    return output_buffer
+
+                if (src_ptr < 0):
+                    raise ValueError("scatcomp: match offset %d before the output start at %d" %
+                                     (dst_index - src_ptr, dst_index))
+
+                end = dst_index + high_4_b + 1
+
+                if (end > size):
+                    end = size
+
+                if (src_ptr + end - dst_index <= dst_index):
+                    output_buffer[dst_index:end] = output_buffer[src_ptr:src_ptr + end - dst_index]
+                elif (src_ptr < dst_index):
+                    # overlapping match, the pattern repeats every distance bytes
+                    pattern = output_buffer[src_ptr:dst_index]
+                    output_buffer[dst_index:end] = (pattern * ((end - dst_index) // len(pattern) + 1))[:end - dst_index]
+
+                dst_index = end
+
+    except IndexError:
+        raise ValueError("scatcomp: truncated input at %d" % src_index)
+
+    return output_buffer
+
+# the former implementation, one read_byte call per input byte and a byte by byte copy
+def legacy_decompress(read_byte, src, cnt, size=None):
+
+    src_index = 0
+    dst_index = 0
+
+    if (size == None):
+        size = cnt
+
+    output_buffer = bytearray(size)
+
+    while (src_index < cnt):
+
+        cur_byte = read_byte(src + src_index)
+        src_index += 1
+
+        cpy_bytes = cur_byte & 3
+
+        if (cpy_bytes == 0):
+            cpy_bytes = read_byte(src + src_index)
+            src_index += 1
+
+        high_4_b = cur_byte >> 4
+
+        if (high_4_b == 0):
+            high_4_b = read_byte(src + src_index)
+            src_index += 1
+
+        for _ in range(cpy_bytes):
+
+            if (dst_index >= size):
+                return bytes(list(output_buffer))
+
+            output_buffer[dst_index] = read_byte(src + src_index)
+
+            dst_index += 1
+            src_index += 1
+
+        if (high_4_b):
+
+            offset = read_byte(src + src_index)
+            src_index += 1
+
+            bit_2_3 = cur_byte & 0xC
+
+            src_ptr = dst_index - offset
+
+            if (bit_2_3 == 0xC):
+                bit_2_3 = read_byte(src + src_index)
+                src_index += 1
+                src_ptr -= 256 * bit_2_3
+            else:
+                src_ptr -= 64 * bit_2_3
+
+            for _ in range(high_4_b + 1):
+
+                if (dst_index >= size):
+                    return bytes(list(output_buffer))
+
+                if (src_ptr > size):
+                    return bytes(list(output_buffer))
+
+                if (src_ptr < 0):
+                    return bytes(list(output_buffer))
+
+                output_buffer[dst_index] = output_buffer[src_ptr]
+
+                dst_index += 1
+                src_ptr += 1
+
+    return bytes(list(output_buffer))
+
+# (output, None) or (None, error), runs in the worker processes
+def decompress_outcome(compressed, cnt):
+
+    try:
+        return (decompress(compressed, cnt), None)
+    except ValueError as e:
+        return (None, e)
+
+# a python interpreter for the worker processes, inside IDA sys.executable is IDA itself
+def python_executable():
+
+    if (os.path.basename(sys.executable).lower().startswith("python")):
+        return sys.executable
+
+    if (os.name == "nt"):
+        candidates = [os.path.join(sys.exec_prefix, "python.exe")]
+    else:
+        candidates = [os.path.join(sys.exec_prefix, "bin", "python%d.%d" % sys.version_info[:2]),
+                      os.path.join(sys.exec_prefix, "bin", "python3")]
+
+    for candidate in candidates:
+        if (os.path.isfile(candidate)):
+            return candidate
+
+    return None
+
+# a process pool for a number of regions, None if they are decompressed serially
+def start_pool(regions, workers=None):
+
+    if (workers == None):
+        workers = int(os.environ.get("SHANNON_DECOMPRESS_WORKERS", os.cpu_count() or 1))
+
+    if (len(regions) < 2 or workers < 2):
+        return None
+
+    if (sum(cnt for compressed, cnt in regions) < PARALLEL_MIN_SIZE):
+        return None
+
+    executable = python_executable()
+
+    if (executable == None):
+        return None
+
+    context = multiprocessing.get_context("spawn")
+    context.set_executable(executable)
+
+    try:
+        return concurrent.futures.ProcessPoolExecutor(min(workers, len(regions)), mp_context=context)
+    except (OSError, ValueError):
+        return None
+
+def collect(futures, regions):
+
+    for future, (compressed, cnt) in zip(futures, regions):
+
+        try:
+            yield future.result()
+        except (concurrent.futures.process.BrokenProcessPool, OSError):
+            # a worker died, do this one here
+            yield decompress_outcome(compressed, cnt)
+
+# decompress (compressed, cnt) regions concurrently, the outcomes are yielded in the
+# order of the regions while the later ones are still running
+def decompress_all(regions, workers=None):
+
+    executor = start_pool(regions, workers)
+
+    if (executor == None):
+        return (decompress_outcome(compressed, cnt) for compressed, cnt in regions)
+
+    futures = [executor.submit(decompress_outcome, compressed, cnt) for compressed, cnt in regions]
+
+    # the workers finish the submitted regions and exit
+    executor.shutdown(wait=False)
+
+    return collect(futures, regions)
+
+# append a token, literals are at most MAX_LITERALS bytes, match is 0 or MIN_MATCH..MAX_MATCH
+def emit_token(out, literals, match, distance):
+
+    high = distance >> 8
+
+    token = 0
+
+    if (1 <= len(literals) <= 3):
+        token |= len(literals)
+
+    if (2 <= match <= 16):
+        token |= (match - 1) << 4
+
+    if (match):
+        token |= (3 if high >= 3 else high) << 2
+
+    out.append(token)
+
+    if (token & 3 == 0):
+        out.append(len(literals))
+
+    if (token >> 4 == 0):
+        out.append(match - 1 if match else 0)
+
+    out += literals
+
+    if (match):
+
+        out.append(distance & 0xFF)
+
+        if (high >= 3):
+            out.append(high)
+
+# length of the match between two positions, limit bytes at most
+def match_length(data, cand, pos, limit):
+
+    length = 0
+
+    while (length + 8 <= limit and data[cand + length:cand + length + 8] == data[pos + length:pos + length + 8]):
+        length += 8
+
+    while (length < limit and data[cand + length] == data[pos + length]):
+        length += 1
+
+    return length
+
+# greedy LZ77 with hash chains, produces the token format of decompress()
+def compress(data, max_chain=MAX_CHAIN):
+
+    data = bytes(data)
+    data_len = len(data)
+
+    out = bytearray()
+
+    # 3 byte prefix -> positions, the most recent last
+    chains = {}
+
+    pos = 0
+    lit_start = 0
+
+    while (pos < data_len):
+
+        best_len = 0
+        best_dist = 0
+
+        if (pos + MIN_MATCH <= data_len):
+
+            key = data[pos:pos + MIN_MATCH]
+            chain = chains.get(key)
+            limit = min(MAX_MATCH, data_len - pos)
+
+            if (chain != None):
+
+                for cand in reversed(chain):
+
+                    if (pos - cand > MAX_DISTANCE):
+                        break
+
+                    length = match_length(data, cand, pos, limit)
+
+                    if (length > best_len):
+
+                        best_len = length
+                        best_dist = pos - cand
+
+                        if (length == limit):
+                            break
+
+                chain.append(pos)
+
+                if (len(chain) > max_chain * 2):
+                    del chain[:-max_chain]
+            else:
+                chains[key] = [pos]
+
+        if (best_len < MIN_MATCH):
+            pos += 1
+            continue
+
+        # long literal runs are split into tokens without a match
+        while (pos - lit_start > MAX_LITERALS):
+            emit_token(out, data[lit_start:lit_start + MAX_LITERALS], 0, 0)
+            lit_start += MAX_LITERALS
+
+        emit_token(out, data[lit_start:pos], best_len, best_dist)
+
+        # index the matched positions as well, the chains are cheap
+        for skipped in range(pos + 1, min(pos + best_len, data_len - MIN_MATCH + 1)):
+            chains.setdefault(data[skipped:skipped + MIN_MATCH], []).append(skipped)
+
+        pos += best_len
+        lit_start = pos
+
+    while (lit_start < data_len):
+        emit_token(out, data[lit_start:lit_start + MAX_LITERALS], 0, 0)
+        lit_start += MAX_LITERALS
+
+    return bytes(out)
+
+# a synthetic payload with roughly the given entropy in bits per byte, snippets of
+# the previous output are repeated like code and tables in a real region
+def payload(size, entropy, seed=0):
+
+    rng = random.Random(seed)
+
+    alphabet = rng.randbytes(max(1, min(256, int(2 ** entropy))))
+
+    # higher entropy, less repetition
+    repeat = max(0.0, 1.0 - entropy / 8.0)
+
+    data = bytearray()
+
+    while (len(data) < size):
+
+        if (len(data) > 16 and rng.random() < repeat):
+            start = rng.randrange(max(0, len(data) - MAX_DISTANCE), len(data) - 4)
+            data += data[start:start + rng.randint(4, 64)]
+        else:
+            data += bytes(rng.choice(alphabet) for _ in range(rng.randint(1, 32)))
+
+    return bytes(data[:size])
+
+# sizes and entropies of the generated corpus
+CORPUS_SIZES = (0, 1, 100, 0x1000, 0x10000, 0x100000)
+CORPUS_ENTROPIES = (0, 2, 4, 6, 8)
+
+def corpus(sizes=CORPUS_SIZES, entropies=CORPUS_ENTROPIES, seed=0):
+
+    for size in sizes:
+        for entropy in entropies:
+            yield ("%x_e%d" % (size, entropy), payload(size, entropy, seed + size + entropy))
+
+# round trip random payloads, then check that corrupted streams are rejected with a
+# ValueError instead of another exception
+def fuzz(iterations, seed, max_size):
+
+    rng = random.Random(seed)
+
+    failures = 0
+
+    for i in range(iterations):
+
+        data = payload(rng.randint(0, max_size), rng.uniform(0, 8), rng.getrandbits(32))
+        compressed = compress(data)
+
+        output = decompress(compressed, len(compressed), len(data))
+
+        if (output != data):
+            print("[e] round trip failed, iteration %d, %d bytes" % (i, len(data)))
+            failures += 1
+            continue
+
+        if (len(compressed) == 0):
+            continue
+
+        corrupted = bytearray(compressed)
+
+        for _ in range(rng.randint(1, 4)):
+            corrupted[rng.randrange(len(corrupted))] = rng.getrandbits(8)
+
+        # cut the stream at a random point as well
+        corrupted = corrupted[:rng.randint(1, len(corrupted))]
+
+        try:
+            decompress(corrupted, len(corrupted), len(data))
+        except ValueError:
+            pass
+        except Exception as e:
+            print("[e] corrupted stream raised %r, iteration %d" % (e, i))
+            failures += 1
+
+    print("[i] %d iterations, %d failures" % (iterations, failures))
+
+    return 1 if failures else 0
+
+def bench(sizes, entropies, legacy):
+
+    print("%10s %8s %8s %14s %14s" % ("MB", "entropy", "ratio", "engine MB/s", "legacy MB/s"))
+
+    for size in sizes:
+
+        for entropy in entropies:
+
+            data = payload(int(size * 0x100000), entropy)
+            compressed = compress(data)
+
+            start_time = time.perf_counter()
+            output = decompress(compressed, len(compressed), len(data))
+            runtime = time.perf_counter() - start_time
+
+            if (output != data):
+                print("[e] round trip failed")
+                return 1
+
+            legacy_speed = "-"
+
+            if (legacy):
+
+                start_time = time.perf_counter()
+                legacy_output = legacy_decompress(compressed.__getitem__, 0, len(compressed), len(data))
+                legacy_speed = "%.2f" % (len(data) / (time.perf_counter() - start_time) / 0x100000)
+
+                if (legacy_output != output):
+                    print("[e] output differs from the legacy implementation")
+                    return 1
+
+            print("%10.1f %8d %8.2f %14.2f %14s" % (len(data) / 0x100000, entropy, len(data) / max(len(compressed), 1),
+                                                    len(data) / runtime / 0x100000, legacy_speed))
+
+    return 0
+
+def bench_parallel(regions, size, workers):
+
+    compressed = compress(payload(int(size * 0x100000), 5))
+    jobs = [(compressed, len(compressed))] * regions
+
+    start_time = time.perf_counter()
+    serial = list(decompress_all(jobs, 1))
+    serial_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    parallel = list(decompress_all(jobs, workers))
+    parallel_time = time.perf_counter() - start_time
+
+    if (parallel != serial):
+        print("[e] parallel output differs")
+        return 1
+
+    print("[i] %d regions of %d bytes: serial %.2fs, %s workers %.2fs" % (
+        regions, len(compressed), serial_time, workers if workers != None else "all", parallel_time))
+
+    return 0
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Shannon scatter decompression")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bench_parser = subparsers.add_parser("bench", help="throughput on generated payloads")
+    bench_parser.add_argument("--legacy", action="store_true", help="also time the former implementation")
+    bench_parser.add_argument("--entropy", type=int, nargs="+", default=[2, 5], help="bits per byte")
+    bench_parser.add_argument("sizes", type=float, nargs="*", default=[1], help="payload sizes in MB")
+
+    parallel_parser = subparsers.add_parser("parallel", help="wall time of serial and pooled decompression")
+    parallel_parser.add_argument("--regions", type=int, default=8)
+    parallel_parser.add_argument("--size", type=float, default=0.5, help="payload size per region in MB")
+    parallel_parser.add_argument("--workers", type=int)
+
+    fuzz_parser = subparsers.add_parser("fuzz", help="round trip and corruption fuzzing")
+    fuzz_parser.add_argument("--iterations", type=int, default=500)
+    fuzz_parser.add_argument("--seed", type=int, default=0)
+    fuzz_parser.add_argument("--max-size", type=int, default=0x4000)
+
+    corpus_parser = subparsers.add_parser("corpus", help="write the payloads and their compressed regions")
+    corpus_parser.add_argument("output")
+
+    compress_parser = subparsers.add_parser("compress", help="compress a file")
+    compress_parser.add_argument("input")
+    compress_parser.add_argument("output")
+
+    decompress_parser = subparsers.add_parser("decompress", help="decompress a raw region")
+    decompress_parser.add_argument("input")
+    decompress_parser.add_argument("output")
+    decompress_parser.add_argument("--size", type=lambda x: int(x, 0), help="output size, default is the region size")
+
+    args = parser.parse_args(argv)
+
+    if (args.command == "bench"):
+        return bench(args.sizes, args.entropy, args.legacy)
+
+    if (args.command == "parallel"):
+        return bench_parallel(args.regions, args.size, args.workers)
+
+    if (args.command == "fuzz"):
+        return fuzz(args.iterations, args.seed, args.max_size)
+
+    if (args.command == "corpus"):
+
+        os.makedirs(args.output, exist_ok=True)
+
+        for name, data in corpus():
+
+            with open(os.path.join(args.output, name + ".bin"), "wb") as f:
+                f.write(data)
+
+            with open(os.path.join(args.output, name + ".scatcomp"), "wb") as f:
+                f.write(compress(data))
+
+            print("[i] %s: %d bytes" % (name, len(data)))
+
+        return 0
+
+    with open(args.input, "rb") as f:
+        data = f.read()
+
+    if (args.command == "compress"):
+        output = compress(data)
+    else:
+        output = decompress(data, len(data), args.size)
+
+    with open(args.output, "wb") as f:
+        f.write(output)
+
+    print("[i] %d bytes -> %d bytes" % (len(data), len(output)))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
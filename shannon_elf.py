@@ -0,0 +1,398 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - ELF Exporter
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# Writes the database as an ELF32 ARM executable, so other tools (Ghidra, emulators,
+# diffing) get the unpacked image without parsing the TOC, the scatter table and the
+# MPU table again. Every segment (TOC, scatter, MPU, ...) becomes a PT_LOAD program
+# header with a section of the same name. Segments are split at MPU region borders,
+# the R/W/X flags of a piece come from the MPU region with the highest number which
+# covers it, like on the hardware. All names of the database go into the symbol table.
+# Segment bytes and symbols are streamed to the file, only the headers are kept.
+
+import idc
+import idaapi
+import idautils
+import ida_bytes
+import ida_funcs
+import ida_segment
+
+import os
+import shutil
+import struct
+import tempfile
+
+import shannon_mpu
+
+ELF_HEADER = struct.Struct("<16sHHIIIIIHHHHHH")
+PROGRAM_HEADER = struct.Struct("<IIIIIIII")
+SECTION_HEADER = struct.Struct("<IIIIIIIIII")
+SYMBOL = struct.Struct("<IIIBBH")
+
+ELF_IDENT = b"\x7fELF\x01\x01\x01"
+
+ET_EXEC = 2
+EM_ARM = 40
+EF_ARM_EABI_VER5 = 0x05000000
+
+PT_LOAD = 1
+
+# same values as the IDA segment permissions
+PF_X = 1
+PF_W = 2
+PF_R = 4
+
+SHT_PROGBITS = 1
+SHT_SYMTAB = 2
+SHT_STRTAB = 3
+SHT_NOBITS = 8
+
+SHF_WRITE = 1
+SHF_ALLOC = 2
+SHF_EXECINSTR = 4
+
+SHN_ABS = 0xfff1
+
+STB_LOCAL = 0
+STB_GLOBAL = 1
+
+STT_NOTYPE = 0
+STT_OBJECT = 1
+STT_FUNC = 2
+
+SEGMENT_ALIGN = 4
+
+# segments are read from the database in chunks
+CHUNK_SIZE = 0x100000
+
+# a program header and its section, the first file_size bytes are stored in the file
+class ElfRegion:
+
+    def __init__(self, name, start, end, file_size, flags):
+
+        self.name = name
+        self.start = start
+        self.end = end
+        self.file_size = file_size
+        self.flags = flags
+        self.offset = 0
+
+# ELF32 little endian writer. The program headers are written first, then the bytes of
+# the regions, then symbols as they are added. String tables go to a temporary file,
+# the section headers and the ELF header are written on close. The file only shows up
+# under its name once it is complete
+class ElfWriter:
+
+    def __init__(self, path, regions, entry):
+
+        self.path = path
+        self.tmp_path = path + ".%d.tmp" % os.getpid()
+
+        self.regions = regions
+        self.entry = entry
+
+        self.file = open(self.tmp_path, "wb")
+        self.strtab = tempfile.TemporaryFile()
+        self.strtab.write(b"\x00")
+
+        self.symbols = 0
+        self.locals = 1
+
+        self.file.write(bytes(ELF_HEADER.size + len(regions) * PROGRAM_HEADER.size))
+
+        self.symtab_offset = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+
+        if (exc_type == None):
+            self.close()
+        else:
+            self.abort()
+
+    def align(self, alignment):
+
+        pad = -self.file.tell() % alignment
+
+        self.file.write(bytes(pad))
+
+        return self.file.tell()
+
+    # stream the bytes of all regions, read(ea, size) returns the bytes at an address
+    def write_regions(self, read):
+
+        for region in self.regions:
+
+            region.offset = self.align(SEGMENT_ALIGN)
+
+            for ea in range(region.start, region.start + region.file_size, CHUNK_SIZE):
+
+                size = min(CHUNK_SIZE, region.start + region.file_size - ea)
+                chunk = read(ea, size)
+
+                if (chunk == None or len(chunk) != size):
+                    chunk = bytes(size)
+
+                self.file.write(chunk)
+
+        self.file.seek(ELF_HEADER.size)
+
+        for region in self.regions:
+            self.file.write(PROGRAM_HEADER.pack(PT_LOAD, region.offset, region.start, region.start,
+                                                region.file_size, region.end - region.start,
+                                                region.flags, SEGMENT_ALIGN))
+
+        self.file.seek(0, os.SEEK_END)
+
+    # section index of an address, SHN_ABS if no region covers it
+    def section_index(self, ea):
+
+        index = 1
+
+        for region in self.regions:
+
+            if (region.start <= ea < region.end):
+
+                if (ea >= region.start + region.file_size and region.file_size > 0):
+                    return index + 1
+
+                return index
+
+            index += 2 if (0 < region.file_size < region.end - region.start) else 1
+
+        return SHN_ABS
+
+    # local symbols have to be added before the global ones
+    def add_symbol(self, name, value, size, sym_type, bind):
+
+        if (self.symtab_offset == None):
+
+            self.symtab_offset = self.align(SEGMENT_ALIGN)
+
+            # the undefined symbol
+            self.file.write(bytes(SYMBOL.size))
+
+        if (bind == STB_LOCAL):
+
+            if (self.locals != self.symbols + 1):
+                raise ValueError("elf: local symbol %s after a global one" % name)
+
+            self.locals += 1
+
+        name_offset = self.strtab.tell()
+
+        self.strtab.write(name.encode() + b"\x00")
+
+        self.file.write(SYMBOL.pack(name_offset, value, size, (bind << 4) | sym_type, 0,
+                                    self.section_index(value & ~1)))
+
+        self.symbols += 1
+
+    def sections(self):
+
+        sections = []
+
+        for region in self.regions:
+
+            flags = SHF_ALLOC
+
+            if (region.flags & PF_W):
+                flags |= SHF_WRITE
+
+            if (region.flags & PF_X):
+                flags |= SHF_EXECINSTR
+
+            if (region.file_size > 0):
+                sections.append((region.name, SHT_PROGBITS, flags, region.start, region.offset,
+                                 region.file_size))
+
+            if (region.file_size < region.end - region.start):
+                sections.append((region.name, SHT_NOBITS, flags, region.start + region.file_size,
+                                 region.offset + region.file_size, region.end - region.start - region.file_size))
+
+        return sections
+
+    def close(self):
+
+        if (self.symtab_offset == None):
+            self.symtab_offset = self.align(SEGMENT_ALIGN)
+            self.file.write(bytes(SYMBOL.size))
+
+        symtab_size = self.file.tell() - self.symtab_offset
+
+        strtab_offset = self.file.tell()
+        self.strtab.seek(0)
+        shutil.copyfileobj(self.strtab, self.file, CHUNK_SIZE)
+        strtab_size = self.file.tell() - strtab_offset
+
+        sections = self.sections()
+
+        # section name table, the regions are few
+        shstrtab = b"\x00"
+        name_offsets = {}
+
+        for name in [section[0] for section in sections] + [".symtab", ".strtab", ".shstrtab"]:
+
+            if (name not in name_offsets):
+                name_offsets[name] = len(shstrtab)
+                shstrtab += name.encode() + b"\x00"
+
+        shstrtab_offset = self.file.tell()
+        self.file.write(shstrtab)
+
+        section_offset = self.align(SEGMENT_ALIGN)
+        symtab_index = len(sections) + 1
+
+        self.file.write(bytes(SECTION_HEADER.size))
+
+        for name, sh_type, flags, addr, offset, size in sections:
+            self.file.write(SECTION_HEADER.pack(name_offsets[name], sh_type, flags, addr, offset, size,
+                                                0, 0, SEGMENT_ALIGN, 0))
+
+        self.file.write(SECTION_HEADER.pack(name_offsets[".symtab"], SHT_SYMTAB, 0, 0, self.symtab_offset,
+                                            symtab_size, symtab_index + 1, self.locals, 4, SYMBOL.size))
+        self.file.write(SECTION_HEADER.pack(name_offsets[".strtab"], SHT_STRTAB, 0, 0, strtab_offset,
+                                            strtab_size, 0, 0, 1, 0))
+        self.file.write(SECTION_HEADER.pack(name_offsets[".shstrtab"], SHT_STRTAB, 0, 0, shstrtab_offset,
+                                            len(shstrtab), 0, 0, 1, 0))
+
+        self.file.seek(0)
+        self.file.write(ELF_HEADER.pack(ELF_IDENT, ET_EXEC, EM_ARM, 1, self.entry,
+                                        ELF_HEADER.size, section_offset, EF_ARM_EABI_VER5,
+                                        ELF_HEADER.size, PROGRAM_HEADER.size, len(self.regions),
+                                        SECTION_HEADER.size, len(sections) + 4, symtab_index + 2))
+
+        self.file.close()
+        self.strtab.close()
+
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+
+        self.file.close()
+        self.strtab.close()
+
+        if (os.path.exists(self.tmp_path)):
+            os.remove(self.tmp_path)
+
+# flags of an address, the MPU region with the highest number wins
+def region_flags(ea, perm, mpu_regions):
+
+    for num, addr, size, read, write, exec in mpu_regions:
+
+        if (addr <= ea < addr + size):
+            return (PF_R if read else 0) | (PF_W if write else 0) | (PF_X if exec else 0)
+
+    # no permissions set means unknown
+    if (perm == 0):
+        return PF_R | PF_W | PF_X
+
+    return perm & (PF_R | PF_W | PF_X)
+
+# bytes of a range which are stored in the file, up to the last loaded byte
+def loaded_size(start, end):
+
+    if (ida_bytes.is_loaded(end - 1)):
+        return end - start
+
+    last = ida_bytes.prev_inited(end, start)
+
+    if (last == idaapi.BADADDR or last < start):
+        return 0
+
+    return last + 1 - start
+
+# all segments of the database split at the MPU region borders
+def get_regions():
+
+    mpu_regions = sorted(shannon_mpu.get_mpu_regions(), reverse=True)
+
+    regions = []
+
+    for s in idautils.Segments():
+
+        seg_t = ida_segment.getseg(s)
+        seg_name = ida_segment.get_segm_name(seg_t)
+
+        borders = {seg_t.start_ea, seg_t.end_ea}
+
+        for num, addr, size, read, write, exec in mpu_regions:
+            for border in (addr, addr + size):
+                if (seg_t.start_ea < border < seg_t.end_ea):
+                    borders.add(border)
+
+        borders = sorted(borders)
+
+        for start, end in zip(borders, borders[1:]):
+            regions.append(ElfRegion(seg_name, start, end, loaded_size(start, end),
+                                     region_flags(start, seg_t.perm, mpu_regions)))
+
+    return regions
+
+# symbol of a named address as (value, size, type), functions get the Thumb bit
+def symbol_info(ea):
+
+    func_o = ida_funcs.get_func(ea)
+
+    if (func_o != None and func_o.start_ea == ea):
+
+        if (idc.get_sreg(ea, "T") == 1):
+            return ea | 1, func_o.end_ea - ea, STT_FUNC
+
+        return ea, func_o.end_ea - ea, STT_FUNC
+
+    flags = ida_bytes.get_flags(ea)
+
+    if (ida_bytes.is_data(flags)):
+        return ea, ida_bytes.get_item_size(ea), STT_OBJECT
+
+    return ea, 0, STT_NOTYPE
+
+# write the database as ELF file
+def export_elf(path):
+
+    idc.msg("[i] exporting elf to %s\n" % path)
+
+    regions = get_regions()
+
+    seg_t = ida_segment.get_segm_by_name("MAIN_file")
+    entry = seg_t.start_ea if seg_t != None else 0
+
+    names = 0
+
+    try:
+        with ElfWriter(path, regions, entry) as writer:
+
+            writer.write_regions(ida_bytes.get_bytes)
+
+            # ARM mapping symbols mark Thumb and ARM code for disassemblers
+            for function_ea in idautils.Functions():
+
+                if (idc.get_sreg(function_ea, "T") == 1):
+                    writer.add_symbol("$t", function_ea, 0, STT_NOTYPE, STB_LOCAL)
+                else:
+                    writer.add_symbol("$a", function_ea, 0, STT_NOTYPE, STB_LOCAL)
+
+            for ea, name in idautils.Names():
+
+                value, size, sym_type = symbol_info(ea)
+
+                writer.add_symbol(name, value, size, sym_type, STB_GLOBAL)
+                names += 1
+
+    except (OSError, ValueError) as e:
+        idc.msg("[e] cannot export elf: %s\n" % e)
+        return 0
+
+    idc.msg("[i] exported %d program headers and %d symbols\n" % (len(regions), names))
+
+    return names
+
+#for debugging purpose export SHANNON_WORKFLOW="NO"
+if (os.environ.get('SHANNON_WORKFLOW') == "NO"):
+    idc.msg("[i] running elf export in standalone mode\n")
+    export_elf(idc.get_input_file_path() + ".elf")
@@ -0,0 +1,365 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - Image Fingerprint
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# This module does not depend on IDA. It identifies an image from its raw bytes
+# before the auto analysis runs: core banner, RVCT build, ShannonOS version, stack
+# protection and Tensor. The loader picks an analysis profile from the result. All
+# searches run over the mmap of the image, a fingerprint takes well below a second.
+
+import argparse
+import collections
+import json
+import struct
+import sys
+import time
+
+import shannon_image
+
+Fingerprint = collections.namedtuple("Fingerprint", ["core", "rvct", "shannon_os", "stack_protector", "tensor", "profile"])
+
+# processor module, default architecture, register tracker limit, analysis flags and
+# TOC entries which are not mapped
+Profile = collections.namedtuple("Profile", ["name", "processor", "architecture", "regtrack_max_xrefs", "analysis", "skip_segments"])
+
+# Old Exynos are ARMv7 (Exynos 3/4/5), old Shannon was Cortex R7, newer are R8.
+# New Exynos are all ARMv8+, but Shannon seems to be still running on a A or R core with ARMv7 ISA.
+# Tensor's Modem seems to be ARMv8 or it does weird things occassionaly
+PROFILES = {
+    # no coagulation and collapse, unlimited register tracking
+    "legacy": Profile("legacy", "arm:ARMv7-A&R", "ARMv7-A&R", 0, "0x9bff9ff7ULL", ()),
+    # stack protected R8 images, same settings as legacy for now, kept apart for tuning
+    "modern": Profile("modern", "arm:ARMv7-A&R", "ARMv7-A&R", 0, "0x9bff9ff7ULL", ()),
+    # limit the register tracking for performance reasons, the images are huge
+    "tensor": Profile("tensor", "arm:ARMv8", "ARMv8", 512, "0x9bff9ff7ULL", ()),
+}
+
+CORE_BANNERS = (b"Cortex-R8", b"Cortex-R7", b"Cortex-A")
+
+RVCT_BANNER = b"ARM RVCT"
+
+STACK_PROTECTOR = b"Check a function"
+
+SHANNON_OS = b"_ShannonOS_"
+
+# search window around a string reference for the MOVs which set up the printf arguments
+ARG_WINDOW_BEFORE = 32
+ARG_WINDOW_AFTER = 16
+
+def ror32(value, shift):
+
+    shift &= 31
+
+    return ((value >> shift) | (value << (32 - shift))) & 0xFFFFFFFF
+
+def thumb_expand_imm(imm12):
+
+    if (imm12 >> 10 == 0):
+
+        imm8 = imm12 & 0xFF
+        mode = (imm12 >> 8) & 3
+
+        if (mode == 0):
+            return imm8
+        if (mode == 1):
+            return (imm8 << 16) | imm8
+        if (mode == 2):
+            return (imm8 << 24) | (imm8 << 8)
+
+        return (imm8 << 24) | (imm8 << 16) | (imm8 << 8) | imm8
+
+    return ror32(0x80 | (imm12 & 0x7F), imm12 >> 7)
+
+# decode a Thumb MOVS (T1), MOV.W (T2) or MOVW (T3) with immediate, returns (rd, value) or None
+def decode_thumb_mov(view, offset):
+
+    if (offset < 0 or offset + 2 > len(view)):
+        return None
+
+    hw1 = struct.unpack_from("<H", view, offset)[0]
+
+    if (hw1 & 0xF800 == 0x2000):
+        return ((hw1 >> 8) & 7, hw1 & 0xFF)
+
+    if (offset + 4 > len(view)):
+        return None
+
+    hw2 = struct.unpack_from("<H", view, offset + 2)[0]
+
+    if (hw2 & 0x8000):
+        return None
+
+    imm12 = (((hw1 >> 10) & 1) << 11) | (((hw2 >> 12) & 7) << 8) | (hw2 & 0xFF)
+    rd = (hw2 >> 8) & 0xF
+
+    if (hw1 & 0xFBF0 == 0xF240):
+        return (rd, ((hw1 & 0xF) << 12) | imm12)
+
+    if (hw1 & 0xFBEF == 0xF04F):
+        return (rd, thumb_expand_imm(imm12))
+
+    return None
+
+# decode an ARM MOV (A1) or MOVW (A2) with immediate, returns (rd, value) or None
+def decode_arm_mov(view, offset):
+
+    if (offset < 0 or offset + 4 > len(view)):
+        return None
+
+    word = struct.unpack_from("<I", view, offset)[0]
+
+    rd = (word >> 12) & 0xF
+
+    if (word & 0x0FEF0000 == 0x03A00000):
+        return (rd, ror32(word & 0xFF, ((word >> 8) & 0xF) * 2))
+
+    if (word & 0x0FF00000 == 0x03000000):
+        return (rd, (((word >> 16) & 0xF) << 12) | (word & 0xFFF))
+
+    return None
+
+# find the PC relative loads (Thumb LDR T1/T2, ARM LDR) of a literal pool word,
+# yields (offset, thumb) of every load
+def find_literal_loads(view, pool):
+
+    # Thumb, T1 reaches 1020 bytes, T2 4095 bytes forward
+    for offset in range(pool - 2, max(pool - 4096, 0) - 1, -2):
+
+        hw1 = struct.unpack_from("<H", view, offset)[0]
+        base = (offset + 4) & ~3
+
+        if (hw1 & 0xF800 == 0x4800 and base + (hw1 & 0xFF) * 4 == pool):
+            yield (offset, True)
+
+        elif (hw1 == 0xF8DF and offset + 4 <= len(view)):
+
+            hw2 = struct.unpack_from("<H", view, offset + 2)[0]
+
+            if (base + (hw2 & 0xFFF) == pool):
+                yield (offset, True)
+
+    # ARM, PC is 8 bytes ahead
+    for offset in range(pool - 8, max(pool - 4104, 0) - 1, -4):
+
+        word = struct.unpack_from("<I", view, offset)[0]
+
+        if (word & 0x0FFF0000 == 0x059F0000 and offset + 8 + (word & 0xFFF) == pool):
+            yield (offset, False)
+
+# encode a Thumb MOVW/MOVT, used to find address materialisations of newer RVCT versions
+def encode_thumb_movw(base, rd, imm16):
+
+    hw1 = base | (((imm16 >> 11) & 1) << 10) | (imm16 >> 12)
+    hw2 = (((imm16 >> 8) & 7) << 12) | (rd << 8) | (imm16 & 0xFF)
+
+    return struct.pack("<HH", hw1, hw2)
+
+# find all code locations which reference a load address, yields (offset, thumb)
+def find_refs(image, view, ea):
+
+    # literal pools are word aligned
+    needle = struct.pack("<I", ea)
+    offset = image.find(needle)
+
+    while (offset >= 0):
+
+        if (offset % 4 == 0):
+            yield from find_literal_loads(view, offset)
+
+        offset = image.find(needle, start=offset + 1)
+
+    # MOVW low, MOVT high pairs
+    for rd in range(13):
+
+        movw = encode_thumb_movw(0xF240, rd, ea & 0xFFFF)
+        movt = encode_thumb_movw(0xF2C0, rd, ea >> 16)
+
+        offset = image.find(movw)
+
+        while (offset >= 0):
+
+            if (bytes(view[offset + 4:offset + 16]).find(movt) >= 0):
+                yield (offset, True)
+
+            offset = image.find(movw, start=offset + 1)
+
+# Thumb 32 bit instructions start with 0b11101, 0b11110 or 0b11111
+def is_thumb32(view, offset):
+    return (offset >= 0 and struct.unpack_from("<H", view, offset)[0] >> 11 >= 0x1D)
+
+# instruction offsets around a reference, walking the instruction boundaries
+# backwards and forwards, ordered by distance
+def walk_insns(view, ref, thumb):
+
+    offsets = []
+
+    offset = ref
+
+    while (offset > ref - ARG_WINDOW_BEFORE and offset > 0):
+
+        if (not thumb):
+            offset -= 4
+        elif (is_thumb32(view, offset - 4)):
+            offset -= 4
+        else:
+            offset -= 2
+
+        offsets.append(offset)
+
+    offset = ref
+
+    while (offset < ref + ARG_WINDOW_AFTER and offset + 4 <= len(view)):
+
+        offset += 4 if (not thumb or is_thumb32(view, offset)) else 2
+
+        offsets.append(offset)
+
+    return sorted(offsets, key=lambda o: abs(o - ref))
+
+# collect the immediates moved into the printf argument registers around a string reference
+def find_args(view, ref, thumb):
+
+    args = {}
+
+    decode = decode_thumb_mov if thumb else decode_arm_mov
+
+    # closest MOV per register wins
+    for offset in walk_insns(view, ref, thumb):
+
+        mov = decode(view, offset)
+
+        if (mov != None and mov[0] not in args):
+            args[mov[0]] = mov[1]
+
+    return args
+
+# ARM RVCT %d.%d [Build %d], the version is in R1-R3 of the printf call
+def find_rvct(image):
+
+    main = image.entry("MAIN")
+    view = image.segment(main)
+
+    offset = image.find(RVCT_BANNER)
+
+    if (offset < 0):
+        return None
+
+    # find the start of the string for the xref
+    start = offset
+
+    while (start > 0 and view[start - 1] >= 0x20 and view[start - 1] < 0x7F):
+        start -= 1
+
+    for ref, thumb in find_refs(image, view, main.address + start):
+
+        args = find_args(view, ref, thumb)
+
+        if (1 not in args or 2 not in args or 3 not in args):
+            continue
+
+        rvct_major_ver, rvct_minor_ver, rvct_build = args[1], args[2], args[3]
+
+        # old images have switched build and subversion
+        if (rvct_minor_ver > rvct_build):
+            rvct_minor_ver, rvct_build = rvct_build, rvct_minor_ver
+
+        if (rvct_major_ver < 2 or rvct_major_ver > 9):
+            continue
+
+        return (rvct_major_ver, rvct_minor_ver, rvct_build)
+
+    return None
+
+def find_core(image):
+
+    for banner in CORE_BANNERS:
+
+        offset = image.find(banner)
+
+        if (offset >= 0):
+            return image.read_cstring(image.entry("MAIN").address + offset, 0x20).decode("ascii", "replace")
+
+    return None
+
+def find_shannon_os(image):
+
+    offset = image.find(SHANNON_OS)
+
+    if (offset < 0):
+        return None
+
+    version = image.read_cstring(image.entry("MAIN").address + offset)
+
+    if (version == None):
+        return None
+
+    return version.decode("ascii", "replace").replace("_", " ").strip()
+
+# pick the analysis profile for a fingerprint
+def choose_profile(tensor, core, stack_protector):
+
+    if (tensor):
+        return "tensor"
+
+    if (stack_protector or (core != None and core.startswith("Cortex-R8"))):
+        return "modern"
+
+    return "legacy"
+
+# fingerprint an open ShannonImage
+def fingerprint(image):
+
+    tensor = image.is_tensor()
+
+    if (image.entry("MAIN") == None):
+        return Fingerprint(None, None, None, False, tensor, choose_profile(tensor, None, False))
+
+    core = find_core(image)
+    stack_protector = (image.find(STACK_PROTECTOR) >= 0)
+
+    return Fingerprint(core, find_rvct(image), find_shannon_os(image), stack_protector, tensor,
+                       choose_profile(tensor, core, stack_protector))
+
+def to_json(fp):
+    return json.dumps(fp._asdict())
+
+def from_json(data):
+
+    fp = json.loads(data)
+
+    if (fp["rvct"] != None):
+        fp["rvct"] = tuple(fp["rvct"])
+
+    return Fingerprint(**fp)
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Shannon modem image fingerprint")
+    parser.add_argument("image")
+    args = parser.parse_args(argv)
+
+    with shannon_image.open_image(args.image) as image:
+
+        start_time = time.process_time()
+        fp = fingerprint(image)
+        runtime = time.process_time() - start_time
+
+    print("[i] core:            %s" % fp.core)
+
+    if (fp.rvct != None):
+        print("[i] ARM RVCT:        %d.%02d [Build %d]" % fp.rvct)
+    else:
+        print("[i] ARM RVCT:        None")
+
+    print("[i] ShannonOS:       %s" % fp.shannon_os)
+    print("[i] stack protector: %s" % fp.stack_protector)
+    print("[i] Tensor:          %s" % fp.tensor)
+    print("[i] profile:         %s" % fp.profile)
+    print("[i] fingerprint took %.3f seconds" % runtime)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
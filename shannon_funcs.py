@@ -17,35 +17,64 @@ import ida_funcs
 import ida_auto
 
 import shannon_generic
+import shannon_mangle
+import shannon_registry
 
-# check if name exists already inside the idb
-def function_exists(name):
+# functions named by shannon_transfer.py, the naming heuristics leave them alone
+transferred_functions = set()
 
-    for addr in idautils.Functions():
+# function names of the idb, built once and kept in sync by the hooks below
+registry = None
+registry_hooks = None
 
-        func_name = idc.get_func_name(addr)
+class name_registry_hooks_t(ida_idp.IDB_Hooks):
 
-        if func_name == name:
-            return True
+    def __init__(self):
+        ida_idp.IDB_Hooks.__init__(self)
 
-    return False
+    def renamed(self, ea, new_name, *args):
+
+        func_o = ida_funcs.get_func(ea)
+
+        if (func_o != None and func_o.start_ea == ea):
+            registry.add(ea, new_name)
+
+        return 0
+
+    def func_added(self, pfn):
+        registry.add(pfn.start_ea, ida_funcs.get_func_name(pfn.start_ea))
+        return 0
+
+    def deleting_func(self, pfn):
+        registry.remove(pfn.start_ea)
+        return 0
+
+def get_registry():
+
+    global registry
+    global registry_hooks
+
+    if (registry == None):
+
+        registry = shannon_registry.NameRegistry(
+            (addr, idc.get_func_name(addr)) for addr in idautils.Functions())
+
+        registry_hooks = name_registry_hooks_t()
+        registry_hooks.hook()
+
+    return registry
+
+# check if name exists already inside the idb
+def function_exists(name):
+    return get_registry().exists(name)
 
 # deal with dupes in some modems
 def function_find_name(name):
 
-    postfix = 0
-    orig_name = name
+    # filter some bad chars before looking for a free name
+    name = name.translate(dict.fromkeys(map(ord, u",~")))
 
-    while (function_exists(name) == True):
-        if (postfix > 0):
-            name = orig_name + "_" + str(postfix)
-        postfix += 1
-        # sanity check
-        if (postfix > 42):
-            break
-
-    # filter some bad chars before returning the string
-    return name.translate(dict.fromkeys(map(ord, u",~")))
+    return get_registry().allocate(name)
 
 # this fixes badly aligned functions in newer BB versions
 # some of them get combined by AA because of the stack protection
@@ -214,10 +243,15 @@ def function_find_tail(addr, stack_err):
 
     return None
 
-# simple mangler
 # if not mangled, all the :: and stuff get's lost if setting the name
 def mangle_name(name):
-    
+
+    mangled_name = shannon_mangle.mangle(name)
+
+    if (mangled_name != None):
+        return mangled_name
+
+    # simple mangler as fallback for names the Itanium mangler does not accept
     name_len = len(name)
     
     parts = name.split("::")
@@ -13,8 +13,11 @@ import ida_name
 import idautils
 import ida_idp
 import ida_nalt
+import ida_netnode
 
 import shannon_funcs
+import shannon_fingerprint
+import shannon_strings
 
 # set True for debug mode
 is_debug = False
@@ -24,6 +27,28 @@ def DEBUG(msg):
     if(is_debug):
         idc.msg(msg)
 
+# persistent key/value store inside the idb, passes loader results to the later stages
+def set_image_info(key, value):
+
+    node = ida_netnode.netnode("$ shannon", 0, True)
+    node.hashset_buf(key, value)
+
+def get_image_info(key):
+
+    node = ida_netnode.netnode("$ shannon", 0, True)
+
+    return node.hashstr(key)
+
+# fingerprint taken by the loader before auto analysis, None for databases of older loader versions
+def get_fingerprint():
+
+    data = get_image_info("fingerprint")
+
+    if (data == None):
+        return None
+
+    return shannon_fingerprint.from_json(data)
+
 # adds a memory segment to the database
 def add_memory_segment(seg_start, seg_size, seg_name, seg_type="DATA", sparse=True, seg_read=True, seg_write=True, seg_exec=True):
 
@@ -77,6 +102,9 @@ def create_name(ea, name):
     for xref in idautils.XrefsTo(ea, 0):
         func_start = idc.get_func_attr(xref.frm, idc.FUNCATTR_START)
 
+        if (func_start in shannon_funcs.transferred_functions):
+            continue
+
         if (func_start != idaapi.BADADDR):
             if (len(name) > 8):
 
@@ -144,16 +172,10 @@ def create_long_strings(length=11):
 
     idc.msg("[i] creating long strings\n")
 
-    strings = idautils.Strings()
-
-    strings.setup(strtypes=[ida_nalt.STRTYPE_C], ignore_instructions=True, minlen=length)
-
-    strings.refresh()
+    # the catalog is built once, later calls only scan segments added in between
+    created = shannon_strings.create_strings(length)
 
-    for s in strings:
-        # sanity check, is unknown bytes?
-        if (idc.is_unknown(idc.get_full_flags(s.ea))):
-            ida_bytes.create_strlit(s.ea, 0, ida_nalt.STRTYPE_TERMCHR)
+    idc.msg("[i] created %d strings\n" % created)
 
 # I am using some metrics of the function for analysis instead of pattern since
 # we have a limited number of candidates and highly optimized code which will
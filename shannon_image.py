@@ -0,0 +1,552 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - Image Model
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# This module does not depend on IDA. It parses the TOC of a modem image once
+# over a mmap and hands out the segments as zero-copy memoryviews, so the same
+# logic can be used by the loader and by tooling outside of IDA.
+
+import argparse
+import collections
+import hashlib
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tarfile
+import zlib
+
+import shannon_lz4
+
+TOC_MAGIC = b"TOC"
+
+# TOC entry: name, file offset, load address, size, crc, entry id
+TOC_ENTRY = struct.Struct("<12sIIIII")
+
+TocEntry = collections.namedtuple("TocEntry", ["name", "offset", "address", "size", "crc", "index"])
+
+# check if a header is a Shannon TOC
+def is_toc(header):
+    return (header[:3] == TOC_MAGIC)
+
+# directory for decoded images and other per-image sidecar files, SHANNON_CACHE overrides it
+def cache_dir():
+
+    path = os.environ.get("SHANNON_CACHE")
+
+    if (path == None):
+        path = os.path.join(os.path.expanduser("~"), ".cache", "shannon_modem_loader")
+
+    os.makedirs(path, exist_ok=True)
+
+    return path
+
+# cache key of an input file, based on its path, size and modification time
+def input_key(path):
+
+    st = os.stat(path)
+    key = "%s:%d:%d" % (os.path.realpath(path), st.st_size, st.st_mtime_ns)
+
+    return hashlib.sha1(key.encode()).hexdigest()
+
+# stream decode a compressed input into the cache, returns the path of the decoded image
+def decode_to_cache(path, decoder, suffix=".bin"):
+
+    decoded_path = os.path.join(cache_dir(), input_key(path) + suffix)
+
+    if (os.path.exists(decoded_path)):
+        print("[i] using cached decoded image %s" % decoded_path)
+        return decoded_path
+
+    tmp_path = decoded_path + ".%d.tmp" % os.getpid()
+
+    try:
+        with open(path, "rb") as fin, open(tmp_path, "wb") as fout:
+            size = decoder(fin, fout)
+
+        # rename is atomic, a crash never leaves a half written image in the cache
+        os.replace(tmp_path, decoded_path)
+
+    finally:
+        if (os.path.exists(tmp_path)):
+            os.unlink(tmp_path)
+
+    print("[i] decoded %d bytes to %s" % (size, decoded_path))
+
+    return decoded_path
+
+# Samsung firmware comes as CP_*.tar.md5, a plain ustar archive with a md5 sum appended
+def is_tar(header):
+    return (header[257:262] == b"ustar")
+
+# check if a (possibly lz4 compressed) stream starts with a TOC, consumes the stream
+def _is_modem_stream(fin):
+
+    header = fin.read(4)
+
+    if (is_toc(header)):
+        return True
+
+    if (shannon_lz4.is_lz4(header)):
+        return is_toc(shannon_lz4.peek(StreamChain(header, fin)))
+
+    return False
+
+# re-attach already consumed bytes in front of a stream
+class StreamChain:
+
+    def __init__(self, head, fin):
+        self.head = head
+        self.fin = fin
+
+    def read(self, size=-1):
+
+        data = self.head[:size] if size >= 0 else self.head
+        self.head = self.head[len(data):]
+
+        if (size < 0):
+            return data + self.fin.read()
+
+        if (len(data) < size):
+            data += self.fin.read(size - len(data))
+
+        return data
+
+# find the modem member of an archive by its header, modem.bin(.lz4) is preferred
+# over other images like modem_debug.bin. Member data is skipped with seeks.
+def find_modem_member(tar):
+
+    found = None
+
+    for member in tar:
+
+        if (not member.isfile()):
+            continue
+
+        if (not _is_modem_stream(tar.extractfile(member))):
+            continue
+
+        if (os.path.basename(member.name).startswith("modem.bin")):
+            return member
+
+        if (found == None):
+            found = member
+
+    return found
+
+# decode the modem member of an archive, the member is streamed straight into fout
+def decode_tar_member(fin, fout):
+
+    with tarfile.open(fileobj=fin, mode="r:") as tar:
+
+        member = find_modem_member(tar)
+
+        if (member == None):
+            raise ValueError("no modem image found in archive")
+
+        print("[i] found %s in archive" % member.name)
+
+        member_fd = tar.extractfile(member)
+        header = member_fd.read(4)
+        member_fd = StreamChain(header, member_fd)
+
+        if (shannon_lz4.is_lz4(header)):
+            return shannon_lz4.decompress_stream(member_fd, fout)
+
+        shutil.copyfileobj(member_fd, fout, 0x100000)
+
+        return member.size
+
+# open a modem image, compressed images and archives are decoded into the cache first
+def open_image(path):
+
+    with open(path, "rb") as f:
+        header = f.read(0x200)
+
+    if (shannon_lz4.is_lz4(header)):
+        path = decode_to_cache(path, shannon_lz4.decompress_stream)
+
+    elif (is_tar(header)):
+        path = decode_to_cache(path, decode_tar_member)
+
+    return ShannonImage(path)
+
+# check if a (possibly compressed or archived) input contains a Shannon image
+def probe(path):
+
+    with open(path, "rb") as f:
+
+        header = f.read(0x200)
+
+        if (is_tar(header)):
+            f.seek(0)
+            try:
+                with tarfile.open(fileobj=f, mode="r:") as tar:
+                    return (find_modem_member(tar) != None)
+            except tarfile.TarError:
+                return False
+
+        f.seek(0)
+
+        return _is_modem_stream(f)
+
+class ShannonImage:
+
+    def __init__(self, path=None, buffer=None):
+
+        self.path = path
+        self._file = None
+        self._map = None
+
+        if (path != None):
+            self._file = open(path, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            buffer = self._map
+
+        self.view = memoryview(buffer)
+        self.entries = self.parse_toc()
+
+    @classmethod
+    def from_buffer(cls, buffer):
+        return cls(buffer=buffer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+
+        try:
+            self.view.release()
+        except BufferError:
+            # segment views are still alive somewhere, leave it to the gc
+            return
+
+        if (self._map != None):
+            self._map.close()
+            self._map = None
+
+        if (self._file != None):
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return len(self.view)
+
+    # parse the TOC once, the first entry is the TOC itself and describes its size
+    def parse_toc(self):
+
+        if (len(self.view) < TOC_ENTRY.size or not is_toc(self.view[:3])):
+            raise ValueError("not a Shannon TOC image")
+
+        entries = []
+
+        toc_size = TOC_ENTRY.unpack_from(self.view, 0)[3]
+
+        # old images have a TOC size of 0, the table ends with an empty name anyway
+        if (toc_size < TOC_ENTRY.size or toc_size > len(self.view)):
+            toc_size = len(self.view)
+
+        for offset in range(0, toc_size - TOC_ENTRY.size + 1, TOC_ENTRY.size):
+
+            toc_info = TOC_ENTRY.unpack_from(self.view, offset)
+
+            seg_name = str(toc_info[0], "UTF-8", "replace").strip("\x00")
+
+            if (seg_name == ""):
+                break
+
+            entries.append(TocEntry(seg_name, *toc_info[1:]))
+
+        return entries
+
+    # get a TOC entry by name
+    def entry(self, name):
+
+        for entry in self.entries:
+            if (entry.name == name):
+                return entry
+
+        return None
+
+    # entries which are mapped by the loader, OFFSET and GVERSION with a zero start are markers only
+    def segments(self):
+
+        segs = []
+
+        for entry in self.entries:
+
+            if (entry.name == "TOC"):
+                continue
+
+            if (entry.name in ("OFFSET", "GVERSION") and entry.address == 0x0):
+                continue
+
+            segs.append(entry)
+
+        return segs
+
+    # sha256 of a segment, used as content address for per-image caches
+    def sha256(self, name="MAIN"):
+
+        view = self.segment(name)
+
+        if (view == None):
+            return None
+
+        return hashlib.sha256(view).hexdigest()
+
+    # Tensor images carry a GVERSION marker
+    def is_tensor(self):
+
+        entry = self.entry("GVERSION")
+
+        return (entry != None and entry.address == 0x0)
+
+    # zero-copy view of a segment by name or entry
+    def segment(self, name):
+
+        entry = name
+
+        if (isinstance(name, str)):
+            entry = self.entry(name)
+
+        if (entry == None):
+            return None
+
+        return self.view[entry.offset:entry.offset + entry.size]
+
+    # translate a load address to the segment entry which contains it
+    def entry_by_address(self, ea):
+
+        for entry in self.segments():
+            if (entry.address <= ea < entry.address + entry.size):
+                return entry
+
+        return None
+
+    # read a NUL terminated string at a load address, returns bytes or None
+    def read_cstring(self, ea, max_len=0x400):
+
+        entry = self.entry_by_address(ea)
+
+        if (entry == None):
+            return None
+
+        start = entry.offset + (ea - entry.address)
+        stop = min(start + max_len, entry.offset + entry.size)
+
+        end = self._map_find(b"\x00", start, stop)
+
+        if (end < 0):
+            return None
+
+        return bytes(self.view[start:end])
+
+    # find the file offset of a needle inside a segment, returns -1 if not found
+    def find(self, needle, name="MAIN", start=0):
+
+        entry = self.entry(name)
+
+        if (entry == None):
+            return -1
+
+        offset = self._map_find(needle, entry.offset + start, entry.offset + entry.size)
+
+        if (offset < 0):
+            return -1
+
+        return offset - entry.offset
+
+    def _map_find(self, needle, start, stop):
+
+        # mmap and bytes-likes both provide find(), memoryviews do not
+        buffer = self._map if self._map != None else self.view.obj
+
+        return buffer.find(needle, start, stop)
+
+    # write a segment to an open file descriptor without going through python buffers
+    def write_segment(self, name, out_fd):
+
+        entry = self.entry(name)
+
+        if (entry == None):
+            return 0
+
+        if (self._file != None):
+            return copy_range(self._file.fileno(), out_fd, entry.offset, entry.size)
+
+        return os.write(out_fd, self.segment(entry))
+
+# write a TOC container like a modem image, segments are streamed in as chunks and
+# the file only shows up under its name once the TOC is complete. The loader keeps
+# sidecar files like the unpacked scatter regions in this format, so ShannonImage
+# opens them like any other image
+class TocWriter:
+
+    def __init__(self, path, max_entries):
+
+        self.path = path
+        self.tmp_path = path + ".%d.tmp" % os.getpid()
+
+        self.entries = []
+        self.max_entries = max_entries
+
+        # the TOC entry itself and the segment entries
+        self.toc_size = (max_entries + 1) * TOC_ENTRY.size
+        self.offset = self.toc_size
+
+        self.file = open(self.tmp_path, "wb")
+        self.file.write(bytes(self.toc_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+
+        if (exc_type == None):
+            self.close()
+        else:
+            self.abort()
+
+    # add a segment from an iterable of bytes like chunks, returns the entry
+    def add(self, name, address, chunks):
+
+        if (len(self.entries) >= self.max_entries):
+            raise ValueError("TOC is full")
+
+        if (len(name.encode()) > 12):
+            raise ValueError("TOC name too long: %s" % name)
+
+        size = 0
+        crc = 0
+
+        for chunk in chunks:
+            self.file.write(chunk)
+            size += len(chunk)
+            crc = zlib.crc32(chunk, crc)
+
+        entry = TocEntry(name, self.offset, address, size, crc, len(self.entries) + 1)
+
+        self.entries.append(entry)
+        self.offset += size
+
+        return entry
+
+    def close(self):
+
+        self.file.seek(0)
+        self.file.write(TOC_ENTRY.pack(TOC_MAGIC, 0, 0, self.toc_size, 0, 0))
+
+        for entry in self.entries:
+            self.file.write(TOC_ENTRY.pack(entry.name.encode(), *entry[1:]))
+
+        self.file.close()
+
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+
+        self.file.close()
+
+        if (os.path.exists(self.tmp_path)):
+            os.remove(self.tmp_path)
+
+# copy a file range between descriptors, kernel side if possible
+def copy_range(in_fd, out_fd, offset, count):
+
+    copied = 0
+
+    while (copied < count):
+
+        try:
+            if (hasattr(os, "copy_file_range")):
+                done = os.copy_file_range(in_fd, out_fd, count - copied, offset + copied)
+            else:
+                done = os.sendfile(out_fd, in_fd, offset + copied, count - copied)
+        except OSError:
+            # cross filesystem or unsupported fd types, fall back to pread
+            done = os.write(out_fd, os.pread(in_fd, min(count - copied, 0x100000), offset + copied))
+
+        if (done == 0):
+            break
+
+        copied += done
+
+    return copied
+
+def cmd_inspect(args):
+
+    with open_image(args.image) as image:
+
+        print("%-12s %10s %10s %10s %10s %6s" % ("name", "offset", "address", "size", "crc", "index"))
+
+        for entry in image.entries:
+            print("%-12s %10x %10x %10x %10x %6d" % entry)
+
+        if (image.is_tensor()):
+            print("[i] found GVERSION, this is Tensor land")
+
+def cmd_extract(args):
+
+    os.makedirs(args.output, exist_ok=True)
+
+    with open_image(args.image) as image:
+
+        for entry in image.segments():
+
+            if (args.segments and entry.name not in args.segments):
+                continue
+
+            out_path = os.path.join(args.output, entry.name + ".bin")
+
+            out_fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+            try:
+                size = image.write_segment(entry.name, out_fd)
+            finally:
+                os.close(out_fd)
+
+            print("[i] extracted %s, %d bytes to %s" % (entry.name, size, out_path))
+
+def cmd_unpack(args):
+
+    with open_image(args.image) as image:
+
+        # copyfile uses sendfile on Linux
+        shutil.copyfile(image.path, args.output)
+
+        print("[i] wrote %d bytes to %s" % (len(image), args.output))
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Shannon modem image tool")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    inspect = sub.add_parser("inspect", help="print the TOC")
+    inspect.add_argument("image")
+    inspect.set_defaults(func=cmd_inspect)
+
+    extract = sub.add_parser("extract", help="write segments to a directory")
+    extract.add_argument("image")
+    extract.add_argument("output")
+    extract.add_argument("segments", nargs="*", help="segment names, default is all")
+    extract.set_defaults(func=cmd_extract)
+
+    unpack = sub.add_parser("unpack", help="write the decoded image of a lz4 file or CP_*.tar.md5 archive")
+    unpack.add_argument("image")
+    unpack.add_argument("output")
+    unpack.set_defaults(func=cmd_unpack)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
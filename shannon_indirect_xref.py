@@ -11,6 +11,7 @@ import ida_ua
 import os
 
 import shannon_generic
+import shannon_cache
 
 max_ops = 6
 ref_segs = 0
@@ -129,6 +130,7 @@ def scan_main_indirect_refs():
                             ref_segs += 1                            
                             
                         idc.add_dref(addr, target, idc.XREF_USER | idc.dr_O)
+                        shannon_cache.record_xref(addr, target, idc.XREF_USER | idc.dr_O)
                         idc.set_cmt(addr, ("TW XREF: %x" % target), 0)
                         
                         found_refs += 1
@@ -18,42 +18,55 @@ import ida_segment
 import ida_ida
 import ida_typeinf
 
-import struct
-
 import shannon_structs
 import shannon_generic
+import shannon_image
+import shannon_lz4
+import shannon_fingerprint
+import shannon_dbt
 
+# map the input file once, the TOC model is shared with the CLI in shannon_image,
+# compressed images and archives are stream decoded into the cache before they are mapped
+def open_image():
 
-# This function will create DBT structs, DBT structs are debug references of various kind.
-# The head contains a type byte in position 4, this indicates if a structure is a direct
-# string ref or something else.
-def make_dbt():
-    
-    sc = idautils.Strings()
+    try:
+        return shannon_image.open_image(ida_nalt.get_input_file_path())
+    except (OSError, ValueError) as e:
+        idc.msg("[e] failed to map input file: %s\n" % e)
+        return None
+
+# processor and analysis settings of a profile, see shannon_fingerprint
+def apply_profile(profile):
+
+    idaapi.set_processor_type(profile.processor, ida_idp.SETPROC_LOADER_NON_FATAL)
+    idc.process_config_line("ARM_DEFAULT_ARCHITECTURE = " + profile.architecture)
 
-    sc.setup(strtypes=[ida_nalt.STRTYPE_C],
-             ignore_instructions=True, minlen=4)
+    idc.process_config_line("ARM_SIMPLIFY = NO")
+    idc.process_config_line("ARM_NO_ARM_THUMB_SWITCH = NO")
 
-    sc.refresh()
+    # improve auto analysis
+    idc.process_config_line("ARM_REGTRACK_MAX_XREFS = %d" % profile.regtrack_max_xrefs)
 
-    for i in sc:
-        if ("DBT:" in str(i)):
+    # disable Coagulate and colapse
+    idc.process_config_line("ANALYSIS = " + profile.analysis)
 
-            struct_name = "dbg_trace"
+# This function will create DBT structs, DBT structs are debug references of various kind.
+# The head contains a type byte in position 4, this indicates if a structure is a direct
+# string ref or something else. The records are located in the mapped image, see shannon_dbt.
+def make_dbt(image):
 
-            # read DBT type
-            # header_type = int.from_bytes(ida_bytes.get_bytes((i.ea+3), 1), "little")
-            # if(header_type != 0x3a):
-            #     struct_name = "dbt"
+    struct_name = "dbg_trace"
 
-            struct_id = idc.get_struc_id(struct_name)
-            struct_size = idc.get_struc_size(struct_id)
+    struct_id = idc.get_struc_id(struct_name)
+    struct_size = idc.get_struc_size(struct_id)
 
-            # make sure we start on-point
-            offset = i.ea + str(i).find("DBT:")
+    records = shannon_dbt.find_records(image)
 
-            ida_bytes.del_items(offset, 0, struct_size)
-            ida_bytes.create_struct(offset, struct_size, struct_id)
+    for offset in records:
+        ida_bytes.del_items(offset, 0, struct_size)
+        ida_bytes.create_struct(offset, struct_size, struct_id)
+
+    idc.msg("[i] created %d DBT structs\n" % len(records))
 
 # validate if the file can be processed by the loader
 def accept_file(fd, fname):
@@ -65,31 +78,37 @@ def accept_file(fd, fname):
     except UnicodeDecodeError:
         return 0
 
-    if (image_type == b"TOC"):
+    if (shannon_image.is_toc(image_type)):
         return {"format": "Shannon Baseband Image", "processor": "arm"}
 
-    return 0
+    fd.seek(0x0)
+    header = fd.read(0x200)
 
-# required IDA Pro load file function
-def load_file(fd, neflags, format):
+    if (shannon_lz4.is_lz4(header)):
 
-    version_string = None
+        # only the first literals are checked here, decoding happens in load_file
+        try:
+            if (shannon_image.probe(fname)):
+                return {"format": "Shannon Baseband Image (lz4)", "processor": "arm"}
+        except (OSError, ValueError):
+            return 0
 
-    # Old Exynos are ARMv7 (Exynos 3/4/5), old Shannon was Cortex R7, newer are R8.
-    # New Exynos are all ARMv8+, but Shannon seems to be still running on a A or R core with ARMv7 ISA.
-    # Tensor's Modem seems to be ARMv8 or it does weird things occassionaly
+    # CP_*.tar.md5 firmware archives, only the member headers are read here
+    if (shannon_image.is_tar(header)):
 
-    idaapi.set_processor_type("arm:ARMv7-A&R", ida_idp.SETPROC_LOADER_NON_FATAL)
-    idc.process_config_line("ARM_DEFAULT_ARCHITECTURE = ARMv7-A&R")
+        try:
+            if (shannon_image.probe(fname)):
+                return {"format": "Shannon Baseband Image (CP archive)", "processor": "arm"}
+        except (OSError, ValueError):
+            return 0
 
-    idc.process_config_line("ARM_SIMPLIFY = NO")
-    idc.process_config_line("ARM_NO_ARM_THUMB_SWITCH = NO")
+    return 0
 
-    # improve auto analysis
-    idc.process_config_line("ARM_REGTRACK_MAX_XREFS = 0")
+# required IDA Pro load file function
+def load_file(fd, neflags, format):
 
-    # disable Coagulate and colapse
-    idc.process_config_line("ANALYSIS = 0x9bff9ff7ULL")
+    # defaults until the image is fingerprinted, a reload keeps what is in the idb
+    apply_profile(shannon_fingerprint.PROFILES["legacy"])
 
     # set compiler defaults
     idc.set_inf_attr(idc.INF_COMPILER, idc.COMP_GNU)
@@ -151,44 +170,75 @@ def load_file(fd, neflags, format):
     idc.msg(r'                                               Modem Loader   ' + "\n\n")
     idc.msg("More: https://github.com/alexander-pick/shannon_modem_loader\n\n")
 
-    start_offset = 0x20
+    image = open_image()
+
+    if (image == None):
+        idc.msg("[e] cannot map input file, unable to parse TOC\n")
+        return 0
+
+    # decoded images are mapped from the cached file instead of the compressed input
+    if (image.path != ida_nalt.get_input_file_path()):
+
+        idc.msg("[i] mapping decoded image %s\n" % image.path)
+
+        fd = idaapi.loader_input_t()
+
+        if (not fd.open(image.path)):
+            idc.msg("[e] cannot open decoded image %s\n" % image.path)
+            return 0
+
+    # content address of the image for the result caches, see shannon_cache
+    main_hash = image.sha256("MAIN")
+
+    if (main_hash != None):
+        shannon_generic.set_image_info("main_sha256", main_hash)
+
+    shannon_generic.set_image_info("image_path", image.path)
+
+    # learn about the image before any analysis runs and pick the settings for it
+    fingerprint = shannon_fingerprint.fingerprint(image)
+    profile = shannon_fingerprint.PROFILES[fingerprint.profile]
 
-    while (1):
+    shannon_generic.set_image_info("fingerprint", shannon_fingerprint.to_json(fingerprint))
 
-        fd.seek(start_offset)
-        entry = fd.read(0x20)
+    if (fingerprint.core != None):
+        idc.msg("[i] found %s\n" % fingerprint.core)
 
-        # unpack TOC entry
-        toc_info = struct.unpack("12sIIIII", entry)
+    if (fingerprint.rvct != None):
+        idc.msg("[i] build using ARM RVCT %d.%02d [Build %d]\n" % fingerprint.rvct)
 
-        seg_name = str(toc_info[0], "UTF-8").strip("\x00")
+    if (fingerprint.stack_protector):
+        idc.msg("[i] image uses stack protection\n")
 
-        if (seg_name == ""):
-            break
+    idc.msg("[i] using %s analysis profile\n" % profile.name)
 
-        seg_start = toc_info[2]
-        seg_end = toc_info[2] + toc_info[3]
+    apply_profile(profile)
+
+    for entry in image.entries:
+
+        seg_name = entry.name
+
+        if (seg_name == "TOC"):
+            continue
+
+        seg_start = entry.address
+        seg_end = entry.address + entry.size
 
         # these seem to be present mostly in older images
         if (seg_name == "OFFSET" and seg_start == 0x0):
             
             idc.msg("[i] found OFFSET, skipping\n")
-            start_offset += 0x20
             continue
 
         if (seg_name == "GVERSION" and seg_start == 0x0):
 
+            # the tensor profile was applied already
             idc.msg("[i] found GVERSION, this is Tensor land\n")
+            continue
 
-            idaapi.set_processor_type("arm:ARMv8", ida_idp.SETPROC_LOADER_NON_FATAL)
-            idc.process_config_line("ARM_DEFAULT_ARCHITECTURE = ARMv8")
-
-            # limit for performance reasons
-            #idc.process_config_line("ARM_REGTRACK_MAX_XREFS = 512")
-
-            tensor = True
-            start_offset += 0x20
+        if (seg_name in profile.skip_segments):
 
+            idc.msg("[i] %s is not loaded by the %s profile, skipping\n" % (seg_name, profile.name))
             continue
 
         # map slices to segments
@@ -202,7 +252,7 @@ def load_file(fd, neflags, format):
 
         idc.set_segm_name(seg_start, seg_name + "_file")
 
-        fd.file2base(toc_info[1], seg_start, seg_end, 0)
+        fd.file2base(entry.offset, seg_start, seg_end, 0)
 
         # set entry points of main and bootloader
         if (seg_name == "BOOT"):
@@ -222,11 +272,6 @@ def load_file(fd, neflags, format):
             idc.set_segm_attr(seg_start, idc.SEGATTR_PERM, ida_segment.SEGPERM_EXEC |
                               ida_segment.SEGPERM_READ | ida_segment.SEGPERM_WRITE)
 
-            # the fancy "ShannonOS" string,
-            version_addr = shannon_generic.search_text(seg_start, seg_end, "_ShannonOS_")
-            if (version_addr != None):
-                version_string = idc.get_strlit_contents(version_addr)
-
             # 0x0  Reset
             # 0x4  Undefined Instruction
             # 0x8  Software Interrupt
@@ -261,8 +306,6 @@ def load_file(fd, neflags, format):
             idc.set_segm_attr(seg_start, idc.SEGATTR_PERM, ida_segment.SEGPERM_EXEC |
                               ida_segment.SEGPERM_READ | ida_segment.SEGPERM_WRITE)
 
-        start_offset += 0x20
-
     idc.msg("[i] Loader completed successfully.\n")
 
     # let's do that before creating any code (avoids false positives in AA)
@@ -270,7 +313,7 @@ def load_file(fd, neflags, format):
 
     # needs to be done very early
     shannon_structs.add_dbt_struct()
-    make_dbt()
+    make_dbt(image)
 
     shannon_structs.add_scatter_struct()
     shannon_structs.add_mpu_region_struct()
@@ -284,8 +327,11 @@ def load_file(fd, neflags, format):
         "python") + '/shannon_postprocess.py\').read())")'
     ida_expr.eval_idc_expr(rv, idaapi.BADADDR, idc_line)
 
-    if (version_string != None):
-        idc.msg("[i] RTOS version:%s\n" % version_string.decode().replace("_", " "))
+    # the fancy "ShannonOS" string
+    if (fingerprint.shannon_os != None):
+        idc.msg("[i] RTOS version: %s\n" % fingerprint.shannon_os)
+
+    image.close()
 
     idc.msg("[i] loader done, starting auto analysis\n")
 
@@ -0,0 +1,269 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - LZ4 Decoder
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# Streaming LZ4 frame decoder for compressed modem images. The python lz4 module
+# is used if it is installed, otherwise a pure python implementation of the frame
+# and block format takes over. Both decode block by block, the output is written
+# to a file object so the full image is never held in memory.
+
+import struct
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+LZ4_MAGIC = b"\x04\x22\x4d\x18"
+LZ4_LEGACY_MAGIC = b"\x02\x21\x4c\x18"
+
+# skippable frames use 0x184D2A50 - 0x184D2A5F
+LZ4_SKIPPABLE_MASK = 0xFFFFFFF0
+LZ4_SKIPPABLE_MAGIC = 0x184D2A50
+
+# linked blocks may reference up to 64KB of previous output
+LZ4_WINDOW = 0x10000
+
+CHUNK_SIZE = 0x100000
+
+# check if a header is a LZ4 frame
+def is_lz4(header):
+    return (header[:4] == LZ4_MAGIC or header[:4] == LZ4_LEGACY_MAGIC)
+
+# decompress a single LZ4 block and append it to out, out may contain history
+def decompress_block(src, out):
+
+    src_index = 0
+    src_len = len(src)
+
+    while (src_index < src_len):
+
+        token = src[src_index]
+        src_index += 1
+
+        # literal length, 15 means more length bytes follow
+        lit_len = token >> 4
+
+        if (lit_len == 15):
+            while (1):
+                cur_byte = src[src_index]
+                src_index += 1
+                lit_len += cur_byte
+                if (cur_byte != 255):
+                    break
+
+        out += src[src_index:src_index + lit_len]
+        src_index += lit_len
+
+        # the last sequence has literals only
+        if (src_index >= src_len):
+            break
+
+        offset = src[src_index] | (src[src_index + 1] << 8)
+        src_index += 2
+
+        match_len = token & 0xF
+
+        if (match_len == 15):
+            while (1):
+                cur_byte = src[src_index]
+                src_index += 1
+                match_len += cur_byte
+                if (cur_byte != 255):
+                    break
+
+        match_len += 4
+
+        if (offset == 0 or offset > len(out)):
+            raise ValueError("lz4: invalid match offset %d" % offset)
+
+        match_start = len(out) - offset
+
+        if (offset >= match_len):
+            out += out[match_start:match_start + match_len]
+        else:
+            # overlapping match, repeat the pattern
+            pattern = out[match_start:]
+            out += (pattern * (match_len // offset + 1))[:match_len]
+
+    return out
+
+def _read_exact(fin, size):
+
+    data = fin.read(size)
+
+    if (len(data) != size):
+        raise ValueError("lz4: truncated input")
+
+    return data
+
+# decode one LZ4 frame after its magic, returns bytes written
+def _decompress_frame(fin, fout):
+
+    flg, bd = _read_exact(fin, 2)
+
+    if ((flg >> 6) != 1):
+        raise ValueError("lz4: unsupported frame version")
+
+    block_checksum = flg & 0x10
+    content_size = flg & 0x08
+    content_checksum = flg & 0x04
+    dict_id = flg & 0x01
+
+    # optional content size, dictionary id and the header checksum
+    _read_exact(fin, (8 if content_size else 0) + (4 if dict_id else 0) + 1)
+
+    history = bytearray()
+    written = 0
+
+    while (1):
+
+        block_size = struct.unpack("<I", _read_exact(fin, 4))[0]
+
+        # end mark
+        if (block_size == 0):
+            break
+
+        stored = block_size & 0x80000000
+        block = _read_exact(fin, block_size & 0x7FFFFFFF)
+
+        if (block_checksum):
+            _read_exact(fin, 4)
+
+        if (stored):
+            history += block
+            fout.write(block)
+            written += len(block)
+        else:
+            prefix = len(history)
+            history = decompress_block(block, history)
+            fout.write(history[prefix:])
+            written += len(history) - prefix
+
+        # keep only the window which may be referenced by the next block
+        if (len(history) > LZ4_WINDOW):
+            del history[:-LZ4_WINDOW]
+
+    if (content_checksum):
+        _read_exact(fin, 4)
+
+    return written
+
+# decode a legacy frame, blocks are independent and the frame ends at EOF or the next magic
+def _decompress_legacy(fin, fout):
+
+    written = 0
+
+    while (1):
+
+        header = fin.read(4)
+
+        if (len(header) < 4):
+            return written, b""
+
+        if (is_lz4(header)):
+            return written, header
+
+        block_size = struct.unpack("<I", header)[0]
+
+        block = decompress_block(_read_exact(fin, block_size), bytearray())
+        fout.write(block)
+        written += len(block)
+
+# decompress a stream of concatenated frames from fin into fout, returns bytes written
+def decompress_stream(fin, fout):
+
+    if (lz4_frame != None):
+        return _decompress_stream_lib(fin, fout)
+
+    written = 0
+    magic = fin.read(4)
+
+    while (len(magic) == 4):
+
+        if (magic == LZ4_MAGIC):
+            written += _decompress_frame(fin, fout)
+            magic = fin.read(4)
+
+        elif (magic == LZ4_LEGACY_MAGIC):
+            done, magic = _decompress_legacy(fin, fout)
+            written += done
+
+        elif ((struct.unpack("<I", magic)[0] & LZ4_SKIPPABLE_MASK) == LZ4_SKIPPABLE_MAGIC):
+            skip = struct.unpack("<I", _read_exact(fin, 4))[0]
+            _read_exact(fin, skip)
+            magic = fin.read(4)
+
+        else:
+            raise ValueError("lz4: unknown frame magic %s" % magic.hex())
+
+    return written
+
+# same as above, handled by the lz4 module in chunks
+def _decompress_stream_lib(fin, fout):
+
+    written = 0
+    decompressor = lz4_frame.LZ4FrameDecompressor()
+
+    while (1):
+
+        chunk = fin.read(CHUNK_SIZE)
+
+        if (not chunk):
+            break
+
+        while (chunk):
+
+            data = decompressor.decompress(chunk)
+            fout.write(data)
+            written += len(data)
+
+            # concatenated frames, restart with what is left
+            if (decompressor.eof):
+                chunk = decompressor.unused_data
+                decompressor = lz4_frame.LZ4FrameDecompressor()
+            else:
+                chunk = b""
+
+    return written
+
+# return the first literal bytes of a compressed stream without decoding it, used to
+# check the payload type. Every LZ4 block starts with literals since a match needs history.
+def peek(fin):
+
+    magic = fin.read(4)
+
+    if (magic == LZ4_LEGACY_MAGIC):
+        header_size = 0
+    elif (magic == LZ4_MAGIC):
+        flg, bd = _read_exact(fin, 2)
+        header_size = (8 if flg & 0x08 else 0) + (4 if flg & 0x01 else 0) + 1
+    else:
+        return b""
+
+    fin.read(header_size)
+
+    block_size = struct.unpack("<I", _read_exact(fin, 4))[0]
+    stored = (magic == LZ4_MAGIC and block_size & 0x80000000)
+
+    block = fin.read(min(block_size & 0x7FFFFFFF, 0x1000))
+
+    if (stored):
+        return block
+
+    if (not block):
+        return b""
+
+    lit_len = block[0] >> 4
+    src_index = 1
+
+    if (lit_len == 15):
+        while (src_index < len(block)):
+            lit_len += block[src_index]
+            src_index += 1
+            if (block[src_index - 1] != 255):
+                break
+
+    return block[src_index:src_index + lit_len]
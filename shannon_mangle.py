@@ -0,0 +1,234 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - Itanium Name Mangling
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# This module does not depend on IDA. The modem carries qualified C++ names like
+# "ns::Class<T>::method" as strings, IDA shows them best as mangled names. Nested
+# names, templates, constructors/destructors and substitutions are encoded after
+# the Itanium C++ ABI. The parameters of a function are unknown, so no function
+# type is appended and the name demangles without an argument list.
+
+import argparse
+import re
+import sys
+
+BUILTIN_TYPES = {
+    "void": "v",
+    "bool": "b",
+    "char": "c",
+    "signed char": "a",
+    "unsigned char": "h",
+    "short": "s",
+    "unsigned short": "t",
+    "int": "i",
+    "unsigned": "j",
+    "unsigned int": "j",
+    "long": "l",
+    "unsigned long": "m",
+    "long long": "x",
+    "unsigned long long": "y",
+    "float": "f",
+    "double": "d",
+}
+
+literal_re = re.compile(r"^-?\d+[uUlL]*$")
+identifier_re = re.compile(r"^~?[A-Za-z_][A-Za-z0-9_]*$")
+
+# split at a separator outside of template brackets
+def split_top(text, sep):
+
+    parts = []
+    depth = 0
+    start = 0
+    i = 0
+
+    while (i < len(text)):
+
+        if (text[i] == "<"):
+            depth += 1
+        elif (text[i] == ">"):
+            depth -= 1
+        elif (depth == 0 and text.startswith(sep, i)):
+            parts.append(text[start:i])
+            i += len(sep)
+            start = i
+            continue
+
+        i += 1
+
+    parts.append(text[start:])
+
+    return parts
+
+# split a component into its identifier and template arguments
+def split_component(component):
+
+    component = component.strip()
+
+    if (component.endswith(">") and "<" in component):
+        bracket = component.index("<")
+        return component[:bracket].strip(), split_top(component[bracket + 1:-1], ",")
+
+    return component, None
+
+class Mangler:
+
+    def __init__(self):
+        # substitution candidates in the order they appear
+        self.subs = []
+
+    def sub_ref(self, key):
+
+        seq = self.subs.index(key)
+
+        if (seq == 0):
+            return "S_"
+
+        seq -= 1
+        digits = ""
+
+        while (True):
+            digits = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"[seq % 36] + digits
+            seq //= 36
+            if (seq == 0):
+                break
+
+        return "S" + digits + "_"
+
+    def add_sub(self, key):
+
+        if (key not in self.subs):
+            self.subs.append(key)
+
+    def template_args(self, args):
+        return "I" + "".join(self.template_arg(arg.strip()) for arg in args) + "E"
+
+    def template_arg(self, arg):
+
+        if (literal_re.match(arg)):
+
+            value = int(arg.rstrip("uUlL"))
+
+            if (value < 0):
+                return "Lin%dE" % -value
+
+            return "Li%dE" % value
+
+        return self.type(arg)
+
+    def type(self, text):
+
+        text = " ".join(text.split())
+
+        if (text in BUILTIN_TYPES):
+            return BUILTIN_TYPES[text]
+
+        key = "type:" + text
+
+        if (key in self.subs):
+            return self.sub_ref(key)
+
+        if (text.endswith("*")):
+            mangled = "P" + self.type(text[:-1])
+        elif (text.endswith("&")):
+            mangled = "R" + self.type(text[:-1])
+        elif (text.endswith(" const")):
+            mangled = "K" + self.type(text[:-6])
+        elif (text.startswith("const ")):
+            mangled = "K" + self.type(text[6:])
+        else:
+            return self.name(text)
+
+        self.add_sub(key)
+
+        return mangled
+
+    def unqualified(self, ident, parent, function):
+
+        # constructors and destructors are named after their class
+        if (function and parent != None and ident == parent):
+            return "C1"
+
+        if (function and parent != None and ident == "~" + parent):
+            return "D1"
+
+        return str(len(ident)) + ident
+
+    # encode a (qualified) name, nested names are wrapped into N...E
+    def name(self, text, function=False):
+
+        components = [split_component(part) for part in split_top(text, "::")]
+
+        for ident, args in components:
+            if (not identifier_re.match(ident)):
+                raise ValueError("cannot mangle %s" % text)
+
+        keys = []
+        key = ""
+
+        for ident, args in components:
+            key += ("::" if key else "") + ident
+            template_key = key
+            if (args != None):
+                key += "<" + ",".join(arg.strip() for arg in args) + ">"
+            keys.append((template_key, key))
+
+        # the longest prefix which was seen already
+        start = 0
+        mangled = ""
+
+        last = len(components) - 1 if function else len(components)
+
+        for k in range(last, 0, -1):
+            if (keys[k - 1][1] in self.subs):
+                mangled = self.sub_ref(keys[k - 1][1])
+                start = k
+                break
+
+        for k in range(start, len(components)):
+
+            ident, args = components[k]
+            parent = components[k - 1][0] if k > 0 else None
+
+            mangled += self.unqualified(ident, parent, function and k == len(components) - 1)
+
+            if (args != None):
+                self.add_sub(keys[k][0])
+                mangled += self.template_args(args)
+
+            # the function itself is not a substitution candidate
+            if (not function or k < len(components) - 1):
+                self.add_sub(keys[k][1])
+
+        # the whole name was seen already
+        if (start == len(components)):
+            return mangled
+
+        if (len(components) > 1):
+            return "N" + mangled + "E"
+
+        return mangled
+
+# mangle a qualified function name like ns::Class<T>::method, None if it cannot be mangled
+def mangle(name):
+
+    try:
+        return "_Z" + Mangler().name(name, function=True)
+    except (ValueError, IndexError):
+        return None
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Itanium mangling of qualified names")
+    parser.add_argument("names", nargs="+")
+    args = parser.parse_args(argv)
+
+    for name in args.names:
+        print(mangle(name))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,9 +16,18 @@ import ida_idp
 import shannon_generic
 import shannon_funcs
 import shannon_structs
+import shannon_cache
 
+import json
 import os
 
+# hw_SwExceptionHandler(), its callers pass __func__ and assert strings
+sw_exception_handler = None
+
+# regions of the MPU table as (num, addr, size, read, write, exec), kept in the database
+# for the ELF exporter since later segments cut the MPU segments
+mpu_regions = []
+
 def get_segment_boundaries(seg_name="MAIN_file"):
 
     seg_t = ida_segment.get_segm_by_name(seg_name)
@@ -412,6 +421,8 @@ def scan_for_mrc(target_seg="MAIN_file"):
 # check if we found the mpu table
 def validate_mpu_candidate(bl_target):
 
+    global sw_exception_handler
+
     metrics = shannon_generic.get_metric(bl_target)
 
     # enable metrics debug output
@@ -445,6 +456,7 @@ def validate_mpu_candidate(bl_target):
     if (len(metrics[4]) > 250 and (metrics[2] > 24 and metrics[2] < 80)):
         idc.msg("[i] hw_SwExceptionHandler(): %x\n" % bl_target)
         ida_name.set_name(bl_target, " hw_SwExceptionHandler", ida_name.SN_NOCHECK)
+        sw_exception_handler = bl_target
 
     # commonly just an LDR but behaves wonky across versions, so disabled atm
     # if (len(metrics[4]) > 200 and metrics[2] < 3):
@@ -483,6 +495,8 @@ def process_mpu_table(tbl_candidates):
             max_entries = 0x20
             entries = 0
 
+            mpu_regions.clear()
+
             num_ptr = shannon_structs.get_offset_by_name(tif, "num")
             addr_ptr = shannon_structs.get_offset_by_name(tif, "addr")
             size_ptr = shannon_structs.get_offset_by_name(tif, "size")
@@ -503,6 +517,7 @@ def process_mpu_table(tbl_candidates):
 
                 if (num == 0xff):
                     idc.msg("[i] reached end of mpu tbl at %x\n" % mpu_tbl)
+                    save_mpu_regions()
                     return True
 
                 if (entries == max_entries):
@@ -510,7 +525,7 @@ def process_mpu_table(tbl_candidates):
                     return False
 
                 xn = int.from_bytes(ida_bytes.get_bytes((mpu_tbl + xn_ptr), 4), "little")
-                ap = int.from_bytes(ida_bytes.get_bytes((mpu_tbl + xn_ptr), 4), "little")
+                ap = int.from_bytes(ida_bytes.get_bytes((mpu_tbl + ap_ptr), 4), "little")
                 
                 read    = True
                 write   = True
@@ -535,12 +550,31 @@ def process_mpu_table(tbl_candidates):
 
                 shannon_generic.add_memory_segment(
                     addr, size, "MPU_" + str(num), seg_type, 0, read, write, exec)
-                
+
+                mpu_regions.append((num, addr, size, read, write, exec))
+
                 mpu_tbl += struct_size
                 entries += 1
 
+    save_mpu_regions()
+
     return True
 
+# keep the MPU regions in the database, they are replayed by the result cache
+def save_mpu_regions():
+
+    shannon_generic.set_image_info("mpu_regions", json.dumps(mpu_regions))
+    shannon_cache.record_info("mpu_regions")
+
+# MPU regions of the database, empty for databases of older loader versions
+def get_mpu_regions():
+
+    data = shannon_generic.get_image_info("mpu_regions")
+
+    if (data == None):
+        return []
+
+    return [tuple(region) for region in json.loads(data)]
 
 #for debugging purpose export SHANNON_WORKFLOW="NO"
 if (os.environ.get('SHANNON_WORKFLOW') == "NO"):
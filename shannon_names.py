@@ -6,189 +6,203 @@
 
 import idc
 import ida_bytes
-import ida_nalt
 import idautils
 import idaapi
-import ida_segment
-import ida_search
 import ida_ua
-import ida_funcs
+import ida_name
 
 import re
 import os
 
-import shannon_generic
 import shannon_funcs
+import shannon_strings
+import shannon_mpu
+import shannon_debug_traces
 
-def restore_cpp_names():
+# naming evidence of the inference below, score per source
+EVIDENCE_WEIGHTS = {
+    # __func__ or assert string passed to hw_SwExceptionHandler()
+    "assert": 6,
+    # ss_ string loaded right before a call, the function name macro
+    "ss_macro": 5,
+    # any other reference to a ss_ string
+    "ss": 3,
+    # qualified C++ name
+    "cpp": 3,
+    # the name mentions the dominant DBT source file of the function
+    "dbt_match": 1,
+}
 
-    idc.msg("[i] trying to reconstruct cpp names from strings\n")
-    sc = idautils.Strings()
+# ss_ function names and qualified C++ names in one pass over the raw bytes
+name_candidate_re = re.compile(rb"(?<![\x20-\x7e])(?:(?P<ss>ss_[A-Za-z0-9_]{5,})|"
+                               rb"(?P<cpp>(?:[A-Za-z_][\w<>,*& ]*::){2,}~?[A-Za-z_]\w*))\x00")
 
-    for i in sc:
-        # step 1 - find a function name
-        regex = "([a-z]*::[A-Za-z_]*::[A-Za-z_]*)"
+identifier_re = re.compile(rb"[A-Za-z_][A-Za-z0-9_]{7,}")
 
-        if (re.match(regex, str(i))):
-            shannon_generic.create_name(i.ea, str(i))
+module_re = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
 
-# restores the function names of SS related functions from a macro created function structure
+# scores candidate names per function, the candidate with the highest score wins if it
+# is not tied with another one
+class NameEvidence:
 
-def restore_ss_names():
+    def __init__(self):
+        # func -> name -> score
+        self.scores = {}
+        # func -> name -> sources
+        self.sources = {}
 
-    idc.msg("[i] trying to reconstruct ss names from function macros\n")
+    def add(self, func_start, name, source):
 
-    # step 1 - find a function name
+        scores = self.scores.setdefault(func_start, {})
+        scores[name] = scores.get(name, 0) + EVIDENCE_WEIGHTS[source]
 
-    # search only in main to avoid unnecessary long runtimes
-    seg_t = ida_segment.get_segm_by_name("MAIN_file")
+        self.sources.setdefault(func_start, {}).setdefault(name, set()).add(source)
 
-    ss_offset = shannon_generic.search_text(
-        seg_t.start_ea, seg_t.end_ea, "ss_DecodeGmmFacilityMsg")
+    def candidates(self, func_start):
+        return self.scores.get(func_start, {})
 
-    if (ss_offset != idaapi.BADADDR):
-        
-        # step 2 - find xrefs to this name, essentially should be just one xref
-        for xref in idautils.XrefsTo(ss_offset, 0):
+    def best(self):
 
-            # sanity check - validate that xref target is a function, or next
-            if (idc.get_func_attr(xref.frm, idc.FUNCATTR_START) == idaapi.BADADDR):
+        names = {}
+
+        for func_start, scores in self.scores.items():
+
+            ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+            if (len(ranked) > 1 and ranked[0][1] == ranked[1][1]):
+                continue
+
+            names[func_start] = ranked[0][0]
+
+        return names
+
+# first call within a few instructions after ea, None if there is none
+def next_call(ea, tries=5):
+
+    while (tries > 0):
+
+        ea = idc.next_head(ea)
+        opcode = ida_ua.ua_mnem(ea)
+
+        if (opcode != None and "BL" in opcode):
+            return ea
+
+        tries -= 1
+
+    return None
+
+# strings loaded by the instructions right before a call, through a literal pool or not
+def loaded_strings(call_ea, tries=5):
+
+    found = []
+    ea = call_ea
+
+    while (tries > 0):
+
+        ea = idc.prev_head(ea)
+        tries -= 1
+
+        value = idc.get_operand_value(ea, 1)
+
+        if (value in shannon_strings.catalog):
+            found.append(shannon_strings.catalog[value])
+            continue
+
+        pool = ida_bytes.get_bytes(value, 4)
+
+        if (pool != None and int.from_bytes(pool, "little") in shannon_strings.catalog):
+            found.append(shannon_strings.catalog[int.from_bytes(pool, "little")])
+
+    return found
+
+# gathers the naming evidence of all functions in a single pass and names the functions
+# without a user defined name after the best candidate
+def infer_names():
+
+    idc.msg("[i] inferring function names from naming evidence\n")
+
+    evidence = NameEvidence()
+
+    # step 1 - ss_ and C++ names in the raw bytes, all references are resolved at once
+    candidates = {}
+
+    for ea, match in shannon_strings.search(name_candidate_re):
+        candidates[ea] = match.lastgroup, match.group(match.lastgroup).decode()
+
+    refs = shannon_strings.find_references(candidates)
+
+    for ea, (kind, text) in candidates.items():
+
+        for ref in refs[ea]:
+
+            func_start = idc.get_func_attr(ref, idc.FUNCATTR_START)
+
+            if (func_start == idaapi.BADADDR):
+                continue
+
+            source = kind
+
+            if (kind == "ss" and next_call(ref) != None):
+                source = "ss_macro"
+
+            evidence.add(func_start, text, source)
+
+    # step 2 - __func__ and assert strings at the calls of the exception handler
+    if (shannon_mpu.sw_exception_handler != None):
+
+        shannon_strings.update()
+
+        for xref in idautils.XrefsTo(shannon_mpu.sw_exception_handler, 0):
+
+            func_start = idc.get_func_attr(xref.frm, idc.FUNCATTR_START)
+
+            if (func_start == idaapi.BADADDR):
                 continue
-            
-            # step 3 - iterate over the next instructions until we find a function call
-
-            xref_str = None
-            tries = 0
-            prev_offset = xref.frm
-
-            while (tries < 5):
-                
-                # forward search, max 5 instructions
-                xref_str_tmp = idc.next_head(prev_offset)
-                opcode = ida_ua.ua_mnem(xref_str_tmp)
-                
-                if (opcode == None):
-                    tries += 1
-                    continue
-                
-                if ("BL" in opcode):
-                    # shannon_generic.DEBUG("[d] found BL at %x\n" % xref_str_tmp)
-                    # docs said this is a list, but seems to be a generator?
-                    xref_str = next(
-                        idautils.CodeRefsFrom(xref_str_tmp, 0))
-                    break
-                else:
-                    prev_offset = xref_str_tmp
-                    tries += 1
-
-            if (xref_str == None):
-                continue  # abort if not foudn or emptyt list
-
-            idc.msg("[i] found verbose ss_ name function: %x\n" % xref_str)
-            
-            check_failed = 0
-
-            # step 4 - iterate over the all calls to this function
-            for xref_func in idautils.XrefsTo(xref_str, 0):
-
-                tries = 0
-                prev_offset = xref_func.frm
-
-                while (tries < 5):
-                    
-                    cur_offset = idc.prev_head(prev_offset)
-                    opcode = ida_ua.ua_mnem(cur_offset)
-                    
-                    if (opcode == None):
-                        tries += 1
-                        continue
-                    
-                    # Thanks John Doe
-                    if ("DR" in opcode and idc.get_operand_value(cur_offset, 0) == 0x0):
-                        # shannon_generic.DEBUG("[d] found LDR at %x\n" % cur_offset)
-                        break
-                    else:
-                        prev_offset = cur_offset
-                        tries += 1
-
-                # get LDR param which is the function name
-                str_addr = idc.get_operand_value(cur_offset, 1)
-
-                # read string
-                func_name = idc.get_strlit_contents(str_addr)
-
-                # sanity checks
-                if (func_name == None):
-                    # shannon_generic.DEBUG("[d] %x: failed sanity check (None)\n" % str_addr)
-                    check_failed = 1
-                    
-                # this in elif to avoid err with undefined bla
-                elif (len(func_name.decode()) < 8):
-                    # shannon_generic.DEBUG("[d] %x: failed sanity check (length)\n" % str_addr)
-                    check_failed = 1
-
-                if check_failed:
-                    # try to resolve ref
-                    func_name = shannon_generic.resolve_ref(str_addr)
-
-                    if (func_name == None):
-                        # idc.msg(
-                        #     "[e] %x: function name not defined\n" % str_addr)
-                        continue
-
-                func_name_str = func_name.decode()
-
-                # shannon_generic.DEBUG("[d] %x: found function name %s\n" % (str_addr, func_name_str))
-
-                if ("ss_" not in func_name_str):
-                    idc.msg("[e] %x: failed to find function name for %x, found '%s' instead\n" % (
-                        str_addr, xref_func.frm, func_name))
-                    continue
-
-                # create a string at string offfset
-                ida_bytes.create_strlit(str_addr, 0, ida_nalt.STRTYPE_C)
-
-                func_start = idc.get_func_attr(
-                    xref_func.frm, idc.FUNCATTR_START)
-
-                if (func_start != idaapi.BADADDR):
-
-                    if (len(func_name_str) > 8):    
-
-                        func_name = shannon_funcs.function_find_name(func_name_str)       
-
-                        idaapi.set_name(func_start, func_name)
-                    else:
-                        idc.msg("[e] %x: function name too short: %s" %
-                                (func_start, func_name_str))
-                else:
-                    # shannon_generic.DEBUG("[d] not a function, searching for start\n")
-                    cur_offset = xref_func.frm
-                    prev_offset = 0
-                    # find func boundaries
-                    
-                    tries = 150
-                    
-                    while tries:
-                        
-                        # possible bailout
-                        tries -= 1
-                        
-                        flags = idc.get_func_flags(cur_offset)
-                        opcode = ida_ua.ua_mnem(cur_offset)
-
-                        if ((flags == -1) and (opcode != None)):
-                            
-                            prev_offset = cur_offset
-                            cur_offset = idc.prev_head(cur_offset)
-                            
-                        else:
-
-                            ida_funcs.add_func(
-                                prev_offset, idc.prev_head(str_addr))
-                            idaapi.set_name(
-                                prev_offset, shannon_funcs.function_find_name(func_name_str))
-                            break
+
+            for text in loaded_strings(xref.frm):
+                if (identifier_re.fullmatch(text)):
+                    evidence.add(func_start, text.decode(), "assert")
+
+    # step 3 - the dominant source file of the trace sites backs candidates which mention
+    # it, functions without a candidate stay unnamed and only go into the module folder
+    for func_start, file in shannon_debug_traces.get_index().primary_files().items():
+
+        module = os.path.splitext(os.path.basename(file))[0]
+
+        if (not module_re.fullmatch(module)):
+            continue
+
+        for name in list(evidence.candidates(func_start)):
+            if (module.lower() in name.lower()):
+                evidence.add(func_start, name, "dbt_match")
+
+    # step 4 - apply the winners in one batch, names set by the user or a transfer are kept
+    named = 0
+    sources = {}
+
+    for func_start, name in evidence.best().items():
+
+        if (func_start in shannon_funcs.transferred_functions):
+            continue
+
+        if (ida_bytes.has_user_name(idc.get_full_flags(func_start))):
+            continue
+
+        if ("::" in name):
+            func_name = shannon_funcs.mangle_name(name)
+        else:
+            func_name = shannon_funcs.function_find_name(name)
+
+        ida_name.set_name(func_start, func_name, ida_name.SN_NOCHECK | ida_name.SN_FORCE)
+
+        named += 1
+
+        for source in evidence.sources[func_start][name]:
+            sources[source] = sources.get(source, 0) + 1
+
+    idc.msg("[i] named %d of %d functions with evidence (%s)\n" % (
+        named, len(evidence.scores),
+        ", ".join("%s: %d" % (source, count) for source, count in sorted(sources.items()))))
 
 #for debugging purpose export SHANNON_WORKFLOW="NO"
 if (os.environ.get('SHANNON_WORKFLOW') == "NO"):
@@ -23,6 +23,7 @@ import time
 import os
 import pwd
 import glob
+import json
 import threading
 import time
 
@@ -33,13 +34,78 @@ import shannon_scatterload
 import shannon_debug_traces
 import shannon_names
 import shannon_indirect_xref
+import shannon_cache
+import shannon_transfer
+import shannon_elf
 
 post_processed = False
 
+# runtime of the individual post processing phases, reported in the batch summary
+phase_times = {}
+
+# run a post processing phase and account its runtime
+def run_phase(name, func, *args):
+
+    start_time = time.process_time()
+
+    ret = func(*args)
+
+    phase_times[name] = phase_times.get(name, 0) + (time.process_time() - start_time)
+
+    return ret
+
+# collect the results of the post processing and write them as json, used by shannon_batch.py
+def write_summary(summary_path, runtime):
+
+    summary = {
+        "image": ida_nalt.get_input_file_path(),
+        "tasks": [],
+        "scatter_regions": [],
+        "mpu_regions": [],
+        "functions": 0,
+        "named_functions": 0,
+        "phases": phase_times,
+        "runtime": runtime,
+    }
+
+    for s in idautils.Segments():
+
+        seg_name = idc.get_segm_name(s)
+        region = {"name": seg_name, "start": s, "end": idc.get_segm_end(s)}
+
+        if (seg_name.startswith("SCAT")):
+            summary["scatter_regions"].append(region)
+
+        if (seg_name.startswith("MPU_")):
+            summary["mpu_regions"].append(region)
+
+    for function_ea in idautils.Functions():
+
+        func_name = ida_funcs.get_func_name(function_ea)
+
+        summary["functions"] += 1
+
+        if (not func_name.startswith("sub_")):
+            summary["named_functions"] += 1
+
+        if (func_name.startswith("pal_TaskInit_")):
+            summary["tasks"].append(func_name[len("pal_TaskInit_"):])
+
+    with open(summary_path, "w") as f:
+        json.dump(summary, f, indent=2)
+
+    idc.msg("[i] summary written to %s\n" % summary_path)
+
 # identify the non returning function which belongs to the stack protection, if it exists
 # we deal with a very new BB - like 5G new.
 def find_cookie_monster():
 
+    fingerprint = shannon_generic.get_fingerprint()
+
+    # the loader checked for the handler string already
+    if (fingerprint != None and not fingerprint.stack_protector):
+        return False
+
     seg_t = ida_segment.get_segm_by_name("MAIN_file")
 
     offset = shannon_generic.search_text(seg_t.start_ea, seg_t.end_ea, "Check a function")
@@ -61,19 +127,25 @@ def find_rvct():
 
     ARM_reference_compiler = "ARM_Compiler_"
 
-    seg_t = ida_segment.get_segm_by_name("MAIN_file")
+    rvct_major_ver = ""
+    rvct_minor_ver = ""
+    rvct_build = ""
+
+    # the loader decoded the version from the raw image already
+    fingerprint = shannon_generic.get_fingerprint()
 
-    rvct_addr_str = shannon_generic.search_text(seg_t.start_ea, seg_t.end_ea, "ARM RVCT")
+    if (fingerprint != None and fingerprint.rvct != None):
+        rvct_addr_str = None
+        rvct_major_ver, rvct_minor_ver, rvct_build = fingerprint.rvct
+    else:
+        seg_t = ida_segment.get_segm_by_name("MAIN_file")
+        rvct_addr_str = shannon_generic.search_text(seg_t.start_ea, seg_t.end_ea, "ARM RVCT")
 
     if (rvct_addr_str != None):
 
         #find start of the string for xref
         rvct_addr_str = idc.get_item_head(rvct_addr_str)
 
-        rvct_major_ver = ""
-        rvct_minor_ver = ""
-        rvct_build = ""
-
         for rvct_xref in idautils.XrefsTo(rvct_addr_str, 0):
             # ARM RVCT %d.%d [Build %d]
             prev_head = idc.prev_head(rvct_xref.frm)
@@ -107,59 +179,59 @@ def find_rvct():
             # there is commonly just one ref
             break
 
-        if (rvct_major_ver):
-            home_dir = os.path.expanduser(f"~{pwd.getpwuid(os.geteuid())[0]}/")
+    if (rvct_major_ver):
+        home_dir = os.path.expanduser(f"~{pwd.getpwuid(os.geteuid())[0]}/")
 
-            # find matching RVCT installs and set them as include path, if multiple are found -> ask
+        # find matching RVCT installs and set them as include path, if multiple are found -> ask
 
-            rvct_paths = glob.glob(
-                home_dir + "/" + ARM_reference_compiler + "*" + str(rvct_build))
+        rvct_paths = glob.glob(
+            home_dir + "/" + ARM_reference_compiler + "*" + str(rvct_build))
 
-            for rvct in rvct_paths:
+        for rvct in rvct_paths:
 
-                header_path = rvct + "/include/"
+            header_path = rvct + "/include/"
 
-                if (len(rvct_paths) > 1):
-                    ARM_inc_dir = ida_kernwin.ask_yn(
-                        1, "HIDECANCEL\nUse " + header_path + " as include path?")
-                else:
-                    ARM_inc_dir = True
+            if (len(rvct_paths) > 1):
+                ARM_inc_dir = ida_kernwin.ask_yn(
+                    1, "HIDECANCEL\nUse " + header_path + " as include path?")
+            else:
+                ARM_inc_dir = True
 
-                if (ARM_inc_dir):
-                    if (os.path.isdir(header_path)):
-                        ida_typeinf.set_c_header_path(header_path)
-                        idc.msg("[i] set c_header_path to %s\n" % header_path)
+            if (ARM_inc_dir):
+                if (os.path.isdir(header_path)):
+                    ida_typeinf.set_c_header_path(header_path)
+                    idc.msg("[i] set c_header_path to %s\n" % header_path)
 
-                    break
+                break
 
-            # apply signatures if present
-            for sigdir in idaapi.get_ida_subdirs("sig"):
+        # apply signatures if present
+        for sigdir in idaapi.get_ida_subdirs("sig"):
 
-                rvct_sig_file = ARM_reference_compiler + "*" + str(rvct_build) + ".sig"
-                sig_glob = sigdir + "/arm/" + rvct_sig_file
-                sig_files = glob.glob(sig_glob)
+            rvct_sig_file = ARM_reference_compiler + "*" + str(rvct_build) + ".sig"
+            sig_glob = sigdir + "/arm/" + rvct_sig_file
+            sig_files = glob.glob(sig_glob)
 
-                for sig_file in sig_files:
+            for sig_file in sig_files:
 
-                    if (os.path.exists(sig_file)):
-                        
-                        idc.msg("[i] applying signature file %s to all functions in database\n" % sig_file)
+                if (os.path.exists(sig_file)):
+                    
+                    idc.msg("[i] applying signature file %s to all functions in database\n" % sig_file)
 
-                        func_cnt = 0
-                        
-                        for function_ea in idautils.Functions():
-                            #check that the function has no name yet
-                            if("sub_" in ida_funcs.get_func_name(function_ea)):
-                                #shannon_generic.DEBUG("[d] %x\n" % function_ea)
-                                func_cnt += 1
-                                idaapi.apply_idasgn_to(sig_file, function_ea, 0)
-                        
-                        idc.msg("[i] checked %d functions for signature matches\n" % func_cnt)
-                        
-                    else:
+                    func_cnt = 0
+                    
+                    for function_ea in idautils.Functions():
+                        #check that the function has no name yet
+                        if("sub_" in ida_funcs.get_func_name(function_ea)):
+                            #shannon_generic.DEBUG("[d] %x\n" % function_ea)
+                            func_cnt += 1
+                            idaapi.apply_idasgn_to(sig_file, function_ea, 0)
+                    
+                    idc.msg("[i] checked %d functions for signature matches\n" % func_cnt)
+                    
+                else:
 
-                        idc.msg("[i] cannot find signature file %s, please create one\n" %
-                                sig_file)
+                    idc.msg("[i] cannot find signature file %s, please create one\n" %
+                            sig_file)
 
 class idb_finalize_hooks_t(ida_idp.IDB_Hooks):
 
@@ -177,24 +249,92 @@ class idb_finalize_hooks_t(ida_idp.IDB_Hooks):
         else:
             post_processed = True
         
+        # start calculating runtime
+        start_time = time.process_time()
+
+        # the same image was processed before, apply the stored results in bulk
+        results = shannon_cache.load_results()
+
+        if (results != None):
+            run_phase("cache_replay", shannon_cache.replay, results)
+
+            # the callee types of the trace calls are not recorded by the result cache
+            run_phase("trace_calls", shannon_debug_traces.type_trace_calls)
+
+            # neither is the header path, signatures are applied by the auto analysis later
+            run_phase("rvct", find_rvct)
+        else:
+            shannon_cache.start_recording()
+            self.run_heuristics()
+            shannon_cache.stop_recording()
+
+        # not recorded by the result cache, rebuilt from the trace index every time
+        run_phase("module_folders", shannon_debug_traces.make_module_folders)
+
+        # remove "please wait ..." box and display runtime in log
+        idaapi.hide_wait_box()
+
+        phase_start = time.process_time()
+
+        for s in idautils.Segments():
+
+            # reschedule everything for a last auto analysis pass
+            idc.plan_and_wait(idc.get_segm_start(s), idc.get_segm_end(s))
+
+        phase_times["final_analysis"] = time.process_time() - phase_start
+
+        names_export = os.environ.get("SHANNON_NAMES_EXPORT")
+
+        if (names_export != None):
+            run_phase("name_export", shannon_transfer.export_names, names_export)
+
+        # unpacked image with symbols for other tools
+        elf_export = os.environ.get("SHANNON_ELF_EXPORT")
+
+        if (elf_export != None):
+            run_phase("elf_export", shannon_elf.export_elf, elf_export)
+
+        # only set the options of the strings window, idautils.Strings() would rebuild
+        # the list, the post-processing works on the catalog of shannon_strings
+        strlist_options = ida_strlist.get_strlist_options()
+        strlist_options.strtypes = [ida_nalt.STRTYPE_C]
+        strlist_options.minlen = 6
+        strlist_options.ignore_heads = True
+
+        timediff = time.process_time() - start_time
+        idc.msg("[i] post-processing runtime %d minutes and %d seconds\n" %
+                ((timediff / 60), (timediff % 60)))
+
+        # headless batch runs, see shannon_batch.py
+        summary_path = os.environ.get("SHANNON_SUMMARY")
+
+        if (summary_path != None):
+            write_summary(summary_path, timediff)
+
+        return
+
+    # all the heuristics of the post processing, results are recorded by shannon_cache
+    def run_heuristics(self):
+
         # avoid multiple execution paths if a segment get split due to scatter etc.
         boot_processed_once = False
         main_processed_once = False
 
-        # start calculating runtime
-        start_time = time.process_time()
-
         # from here on do the fancy stuff
 
-        shannon_debug_traces.make_dbt_refs()
+        # names of a previous build, matched functions are skipped by the heuristics below
+        names_import = os.environ.get("SHANNON_NAMES_IMPORT")
+
+        if (names_import != None and os.path.exists(names_import)):
+            run_phase("name_transfer", shannon_transfer.import_names, names_import)
+
+        run_phase("dbt_refs", shannon_debug_traces.make_dbt_refs)
 
-        shannon_names.restore_ss_names()
-        shannon_names.restore_cpp_names()
-        shannon_generic.create_long_strings()
+        run_phase("long_strings", shannon_generic.create_long_strings)
 
-        if(find_cookie_monster()):
+        if(run_phase("cookie_monster", find_cookie_monster)):
             # this is a thing for newer baseband versions
-            shannon_indirect_xref.scan_main_indirect_refs()
+            run_phase("indirect_xrefs", shannon_indirect_xref.scan_main_indirect_refs)
 
         for s in idautils.Segments():
 
@@ -232,40 +372,30 @@ class idb_finalize_hooks_t(ida_idp.IDB_Hooks):
 
                     shannon_generic.get_ref_set_name(seg_start + 28, "fiq_v")
 
-                    self.memory_ranges()
+                    run_phase("memory_ranges", self.memory_ranges)
 
                     # it is very important to do this in the correct order
                     # especially for new modems or the result will be left
                     # in a weird state
 
-                    shannon_mpu.find_hw_init()
-                    shannon_mpu.scan_for_mrc()
-
-                    shannon_scatterload.find_scatter()
-
-                    shannon_pal_reconstructor.find_pal_msg_funcs()
-                    shannon_pal_reconstructor.find_pal_init()
+                    run_phase("hw_init", shannon_mpu.find_hw_init)
+                    run_phase("mrc", shannon_mpu.scan_for_mrc)
 
-        find_rvct()
+                    run_phase("scatter", shannon_scatterload.find_scatter)
 
-        # remove "please wait ..." box and display runtime in log
-        idaapi.hide_wait_box()
+                    # only the scatter segments are scanned, the catalog is kept since loading
+                    run_phase("scatter_strings", shannon_generic.create_long_strings)
 
-        for s in idautils.Segments():
-
-            # reschedule everything for a last auto analysis pass
-            idc.plan_and_wait(idc.get_segm_start(s), idc.get_segm_end(s))
+                    run_phase("pal_msg", shannon_pal_reconstructor.find_pal_msg_funcs)
+                    run_phase("pal_init", shannon_pal_reconstructor.find_pal_init)
 
-        # fix strings a last time
-        idautils.Strings().setup(strtypes=[ida_nalt.STRTYPE_C],
-                                 ignore_instructions=True, minlen=6)
-        ida_strlist.build_strlist()
+                    # needs dm_TraceMsg() from the PAL reconstructor
+                    run_phase("trace_calls", shannon_debug_traces.type_trace_calls)
 
-        timediff = time.process_time() - start_time
-        idc.msg("[i] post-processing runtime %d minutes and %d seconds\n" %
-                ((timediff / 60), (timediff % 60)))
+        # all naming evidence is known now, hw_SwExceptionHandler() is found by hw_init
+        run_phase("name_inference", shannon_names.infer_names)
 
-        return
+        run_phase("rvct", find_rvct)
 
     # this adds some memory ranges which are defined in the ARMv7 spec, it also names some "known" offsets
     # LSI does not follow the spec very closly but this is better than nothing and helps to with the auto analysis
@@ -0,0 +1,127 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - Name Registry
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# This module does not depend on IDA. It keeps the function names of the database
+# in hash maps, so checking a name and allocating a free one is O(1) instead of a
+# walk over all functions. shannon_funcs keeps it in sync with the database.
+
+import argparse
+import sys
+import time
+
+class NameRegistry:
+
+    def __init__(self, names=()):
+
+        self.by_name = {}
+        self.by_ea = {}
+
+        # next suffix to try per base name, keeps allocation O(1) for names with many dupes
+        self.next_suffix = {}
+
+        for ea, name in names:
+            self.add(ea, name)
+
+    def __len__(self):
+        return len(self.by_name)
+
+    def exists(self, name):
+        return (name in self.by_name)
+
+    def add(self, ea, name):
+
+        self.remove(ea)
+
+        self.by_name[name] = ea
+        self.by_ea[ea] = name
+
+    def remove(self, ea):
+
+        name = self.by_ea.pop(ea, None)
+
+        if (name != None and self.by_name.get(name) == ea):
+            del self.by_name[name]
+
+    # a free name, dupes get _1, _2, ... in the order they are requested
+    def allocate(self, name):
+
+        if (name not in self.by_name):
+            return name
+
+        postfix = self.next_suffix.get(name, 1)
+
+        while ((name + "_" + str(postfix)) in self.by_name):
+            postfix += 1
+
+        self.next_suffix[name] = postfix
+
+        return name + "_" + str(postfix)
+
+# the former implementation, a scan over all function names per attempt
+def linear_allocate(names, name):
+
+    postfix = 0
+    orig_name = name
+
+    while (name in list(names)):
+        if (postfix > 0):
+            name = orig_name + "_" + str(postfix)
+        postfix += 1
+        # sanity check
+        if (postfix > 42):
+            break
+
+    return name
+
+# name a batch of functions in a database of a given size, a third of the names are dupes
+def bench_registry(functions, renames):
+
+    registry = NameRegistry((ea, "sub_%x" % ea) for ea in range(functions))
+
+    start_time = time.perf_counter()
+
+    for ea in range(renames):
+        name = registry.allocate("ss_Function%d" % (ea % (renames * 2 // 3)))
+        registry.add(ea, name)
+
+    return time.perf_counter() - start_time
+
+def bench_linear(functions, renames):
+
+    names = {ea: "sub_%x" % ea for ea in range(functions)}
+
+    start_time = time.perf_counter()
+
+    for ea in range(renames):
+        names[ea] = linear_allocate(names.values(), "ss_Function%d" % (ea % (renames * 2 // 3)))
+
+    return time.perf_counter() - start_time
+
+def main(argv=None):
+
+    parser = argparse.ArgumentParser(description="Shannon name registry benchmark")
+    parser.add_argument("--renames", type=int, default=3000, help="names set per run")
+    parser.add_argument("--linear", action="store_true", help="also time the former linear scan")
+    parser.add_argument("sizes", type=int, nargs="*", default=[1000, 10000, 60000, 200000])
+    args = parser.parse_args(argv)
+
+    print("%10s %10s %14s %14s" % ("functions", "renames", "registry us/op", "linear us/op"))
+
+    for functions in args.sizes:
+
+        registry_time = bench_registry(functions, args.renames)
+
+        linear = "-"
+
+        if (args.linear):
+            linear = "%.2f" % (bench_linear(functions, args.renames) / args.renames * 1e6)
+
+        print("%10d %10d %14.2f %14s" % (functions, args.renames, registry_time / args.renames * 1e6, linear))
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
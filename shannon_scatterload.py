@@ -13,11 +13,29 @@ import idautils
 import ida_name
 import ida_funcs
 import ida_auto
+import ida_loader
 
 import shannon_generic
-import shannon_structs
+import shannon_cache
+import shannon_decompress
+import shannon_image
 
+import collections
 import os
+import struct
+
+# scatter struct
+# 0 - src
+# 1 - dst
+# 2 - size
+# 3 - op
+ScatterEntry = collections.namedtuple("ScatterEntry", ["src", "dst", "size", "op"])
+
+SCATTER_FORMAT = "<IIII"
+SCATTER_ENTRY_SIZE = struct.calcsize(SCATTER_FORMAT)
+
+# scatter copies are mapped in chunks of this size
+COPY_CHUNK_SIZE = 0x100000
 
 # process the scatter load function
 def process_scatterload(reset_func_cur):
@@ -99,7 +117,7 @@ def create_scatter_tbl(scatterload):
     op_list = list(set(op_list))
 
     ops = find_scatter_functions(op_list)
-    process_scattertbl(scatter_start, scatter_size, ops)
+    process_scattertbl(tbl, ops)
 
 # find the scatter functions in database
 def find_scatter_functions(op_list):
@@ -194,16 +212,47 @@ def find_scatter_functions(op_list):
 
     return [scatter_null, scatter_zero, scatter_copy, scatter_comp]
 
-# scatter struct
-# 0 - src
-# 1 - dst
-# 2 - size
-# 3 - op
-
 #process the scatter table
-def process_scattertbl(scatter_start, scatter_size, ops):
+def process_scattertbl(tbl, ops):
 
-    tbl = read_scattertbl(scatter_start, scatter_size)
+    # regions unpacked by an earlier database of the same image
+    unpacked_path = get_unpacked_path()
+    unpacked = {}
+
+    if (unpacked_path != None):
+        unpacked = {region.name: region for region, path in get_file_entries(unpacked_path)}
+
+    if (len(unpacked) > 0):
+        idc.msg("[i] mapping unpacked scatter regions from %s\n" % unpacked_path)
+
+    # regions unpacked here and all regions with data, the container is rewritten with
+    # the latter if anything was unpacked
+    produced = []
+    stored = []
+
+    # the compressed sources are read first and decompressed in worker processes while
+    # the table is processed, segments and patches are done here in table order
+    regions = []
+    comp_ids = set()
+
+    for scatter_id, entry in enumerate(tbl):
+
+        if (find_unpacked(unpacked, "SCATCOMP_" + str(scatter_id), entry) != None):
+            continue
+
+        if (ops[3] != None and entry[3] == ops[3]):
+
+            compressed = read_compressed(entry[0], entry[2])
+
+            if (compressed != None):
+                regions.append((compressed, entry[2]))
+                comp_ids.add(scatter_id)
+
+    outcomes = shannon_decompress.decompress_all(regions)
+
+    # copies are mapped from the input file unless an earlier entry wrote to the source
+    file_entries = get_file_entries()
+    written = []
 
     scatter_id = 0
 
@@ -246,71 +295,91 @@ def process_scattertbl(scatter_start, scatter_size, ops):
                                                                "SCATTER_" + str(scatter_id),
                                                                "CODE", False)
 
-                            shannon_generic.DEBUG("[d] src: %x cnt: %d dst: %x " %
+                            shannon_generic.DEBUG("[d] src: %x cnt: %d dst: %x\n" %
                                                   (entry[0], entry[2], entry[1]))
 
-                            chunk = ida_bytes.get_bytes(entry[0], entry[2])
+                            seg_name = "SCATTER_" + str(scatter_id)
+                            region = find_unpacked(unpacked, seg_name, entry)
 
-                            shannon_generic.DEBUG("len: %s\n" % (len(chunk)))
+                            if (region != None and map_file(unpacked_path, region.offset, entry[1], region.size)):
+                                copied = region.size
+                            else:
+                                copied = scatterload_copy(entry[0], entry[1], entry[2], file_entries, written)
+                                produced.append((seg_name, entry[1], copied))
 
-                            ida_bytes.put_bytes(entry[1], chunk)
+                            shannon_cache.record_patch(entry[1], copied)
+                            written.append((entry[1], entry[1] + copied))
+                            stored.append((seg_name, entry[1], copied))
 
                     case 3:  # decpmpression
 
-                        chunk = scatterload_decompress(entry[0], entry[2])
+                        chunk = None
 
-                        shannon_generic.add_memory_segment(entry[1], len(chunk),
-                                                           "SCATCOMP_" + str(scatter_id),
-                                                           "CODE", False)
+                        seg_name = "SCATCOMP_" + str(scatter_id)
+                        region = find_unpacked(unpacked, seg_name, entry)
 
-                        idaapi.patch_bytes(entry[1], chunk)
+                        if (region != None):
 
-                        idc.msg("[i] decompressed %d bytes, from %x to %x\n"
-                                % (len(chunk), entry[0], entry[1]))
+                            shannon_generic.add_memory_segment(entry[1], region.size, seg_name, "CODE", False)
 
-            index += 1
-        scatter_id += 1
+                            if (map_file(unpacked_path, region.offset, entry[1], region.size)):
 
-# read and pre-process the scatter table
-def read_scattertbl(scatter_start, scatter_size):
+                                shannon_cache.record_patch(entry[1], region.size)
+                                written.append((entry[1], entry[1] + region.size))
+                                stored.append((seg_name, entry[1], region.size))
 
-    struct_id = idc.get_struc_id("scatter")
-    struct_size = idc.get_struc_size(struct_id)
+                                idc.msg("[i] mapped %d unpacked bytes to %x\n" % (region.size, entry[1]))
+
+                            else:
+                                # the region was not read up front, decompress it here
+                                chunk = scatterload_decompress(entry[0], entry[2])
 
-    tbl = []
+                        if (scatter_id in comp_ids):
 
-    scatter_offset = scatter_start
+                            chunk, error = next(outcomes)
 
-    sptr = shannon_structs.get_struct(struct_id)
-    src_ptr = shannon_structs.get_offset_by_name(sptr, "src")
-    dst_ptr = shannon_structs.get_offset_by_name(sptr, "dst")
-    size_ptr = shannon_structs.get_offset_by_name(sptr, "size")
-    op_ptr = shannon_structs.get_offset_by_name(sptr, "op")
+                            if (error != None):
+                                idc.msg("[e] cannot decompress scatter at %x: %s\n" % (entry[0], error))
 
-    while (scatter_offset < (scatter_start + scatter_size)):
+                        if (chunk != None and len(chunk) > 0):
 
-        entry = []
+                            shannon_generic.add_memory_segment(entry[1], len(chunk), seg_name, "CODE", False)
+
+                            # the IDA API wants bytes, a single copy of the buffer
+                            idaapi.patch_bytes(entry[1], bytes(chunk))
+                            shannon_cache.record_patch(entry[1], len(chunk))
+                            written.append((entry[1], entry[1] + len(chunk)))
+                            produced.append((seg_name, entry[1], len(chunk)))
+                            stored.append((seg_name, entry[1], len(chunk)))
+
+                            idc.msg("[i] decompressed %d bytes, from %x to %x\n"
+                                    % (len(chunk), entry[0], entry[1]))
+
+            index += 1
+        scatter_id += 1
 
-        ida_bytes.del_items(scatter_offset, 0, struct_size)
-        ida_bytes.create_struct(scatter_offset, struct_size, struct_id)
+    # zero and null regions carry no data, they are recreated from the table
+    if (unpacked_path != None and len(produced) > 0):
+        write_unpacked(unpacked_path, stored)
 
-        entry.append(int.from_bytes(ida_bytes.get_bytes(
-            (scatter_offset + src_ptr), 4), "little"))
+# read and pre-process the scatter table, the table is read at once and created as a
+# single array of scatter structs
+def read_scattertbl(scatter_start, scatter_size):
 
-        entry.append(int.from_bytes(ida_bytes.get_bytes(
-            (scatter_offset + dst_ptr), 4), "little"))
+    struct_id = idc.get_struc_id("scatter")
 
-        entry.append(int.from_bytes(ida_bytes.get_bytes(
-            (scatter_offset + size_ptr), 4), "little"))
+    count = scatter_size // SCATTER_ENTRY_SIZE
 
-        entry.append(int.from_bytes(ida_bytes.get_bytes(
-            (scatter_offset + op_ptr), 4), "little"))
+    tbl_bytes = ida_bytes.get_bytes(scatter_start, count * SCATTER_ENTRY_SIZE)
 
-        tbl.append(entry)
+    if (tbl_bytes == None):
+        idc.msg("[e] unable to read scatter table at %x\n" % scatter_start)
+        return []
 
-        scatter_offset += struct_size
+    ida_bytes.del_items(scatter_start, 0, len(tbl_bytes))
+    ida_bytes.create_struct(scatter_start, len(tbl_bytes), struct_id)
 
-    return tbl
+    return [ScatterEntry._make(entry) for entry in struct.iter_unpack(SCATTER_FORMAT, tbl_bytes)]
 
 # find scatter related code
 def find_scatter():
@@ -407,106 +476,166 @@ def find_scatter():
 # the ARM linker supports next to RLE
 
 # decompress from src to dst, input buffer cnt - costed me an arm and a leg to
-# get it working but it now uncompresses 100% of the buffer and does it correctly
+# get it working but it now uncompresses 100% of the buffer and does it correctly.
+# The region is read once, the decoding runs on the buffer in shannon_decompress.py
 def scatterload_decompress(src, cnt):
 
-    src_index = 0
-    dst_index = 0
+    compressed = read_compressed(src, cnt)
 
-    output_buffer = bytearray(cnt)
+    if (compressed == None):
+        return bytearray()
 
-    while (src_index < cnt):
+    try:
+        return shannon_decompress.decompress(compressed, cnt)
+    except ValueError as e:
+        idc.msg("[e] cannot decompress scatter at %x: %s\n" % (src, e))
+        return bytearray()
 
-        # read the current byte from the source and increment the source index
-        cur_byte = ida_bytes.get_byte(src + src_index)
-        src_index += 1
+# TOC entries of the input file, the source of the scatter copies, or of another TOC
+# container like the unpacked scatter regions
+def get_file_entries(image_path=None):
 
-        # extract the lower 2 bits of the current byte
-        cpy_bytes = cur_byte & 3
+    if (image_path == None):
+        image_path = shannon_generic.get_image_info("image_path")
 
-        # if cpy_bytes is 0, read the next byte from the source
-        if (cpy_bytes == 0):
-            cpy_bytes = ida_bytes.get_byte(src + src_index)
-            src_index += 1
+    if (image_path == None or not os.path.exists(image_path)):
+        return []
 
-        # extract the upper 4 bits of the current byte to get 'high_4_b'
-        high_4_b = cur_byte >> 4
+    try:
+        with shannon_image.ShannonImage(image_path) as image:
+            return [(entry, image_path) for entry in image.segments()]
+    except (OSError, ValueError):
+        return []
 
-        # if 'high_4_b' is 0, read the next byte from the source
-        if (high_4_b == 0):
-            high_4_b = ida_bytes.get_byte(src + src_index)
-            src_index += 1
+# copy a scatter region in chunks, returns the number of bytes copied. File backed
+# sources are mapped from the input file with file2base, no copy of the region is
+# made in memory. Everything else is copied with a bounded buffer
+def scatterload_copy(src, dst, size, file_entries, written):
 
-        # copy x bytes from the source to the destination
-        for _ in range(cpy_bytes):
+    for entry, image_path in file_entries:
 
-            if (dst_index >= cnt):
-                #shannon_generic.DEBUG("[d] out of bound write to %x/%x\n" % (cnt, dst_index))
-                return bytes(list(output_buffer))
+        if (src < entry.address or src + size > entry.address + entry.size):
+            continue
 
-            if (dst_index >= len(output_buffer)):
-                output_buffer = output_buffer.ljust(dst_index + 1, b"\x00")
+        # an earlier scatter entry changed the source, the file has the old bytes
+        if (any(start < src + size and src < end for start, end in written)):
+            break
 
-            # copy byte from source to destination
-            byte = ida_bytes.get_byte(src + src_index)
-            output_buffer[dst_index] = byte
+        if (map_file(image_path, entry.offset + src - entry.address, dst, size)):
+            return size
 
-            dst_index += 1
-            src_index += 1
+        break
 
-        # if 'high_4_b' is non-zero, perform additional operations
-        if (high_4_b):
+    copied = 0
 
-            # read the offset byte from the source and increment the source index
-            offset = ida_bytes.get_byte(src + src_index)
-            src_index += 1
+    while (copied < size):
 
-            # extract bits 2 and 3 from the current byte
-            bit_2_3 = cur_byte & 0xC
+        chunk = ida_bytes.get_bytes(src + copied, min(COPY_CHUNK_SIZE, size - copied))
 
-            # calculate the source pointer for backward copy
-            src_ptr = dst_index - offset
+        if (chunk == None):
+            idc.msg("[e] cannot read scatter source at %x\n" % (src + copied))
+            break
 
-            # if both are set 0x12 == b1100
-            if (bit_2_3 == 0xC):
+        ida_bytes.put_bytes(dst + copied, chunk)
+        copied += len(chunk)
 
-                # if bits set, get one more byte
-                bit_2_3 = ida_bytes.get_byte(src + src_index)
-                src_index += 1
-                src_ptr -= 256 * bit_2_3
+    return copied
 
-            else:
-                # otherwise, adjust the source pointer based on extracted bits
-                src_ptr -= 64 * bit_2_3
+# map a file range into the database in chunks, False if the file cannot be opened or a
+# chunk cannot be mapped
+def map_file(path, file_offset, dst, size):
+
+    fd = idaapi.loader_input_t()
+
+    if (not fd.open(path)):
+        return False
+
+    for offset in range(0, size, COPY_CHUNK_SIZE):
+
+        if (fd.file2base(file_offset + offset, dst + offset, dst + min(offset + COPY_CHUNK_SIZE, size),
+                         ida_loader.FILEREG_PATCHABLE) != 1):
+
+            idc.msg("[e] cannot map %x bytes of %s at %x\n" % (size, path, dst))
 
-            # copy 'high_4_b + 1' bytes from the previously decompressed data
-            for _ in range(high_4_b + 1):
+            fd.close()
+
+            return False
+
+    fd.close()
+
+    return True
+
+# the unpacked scatter regions of an image are kept in a TOC container keyed by the
+# hash of MAIN, later databases of the same build map them instead of unpacking
+def get_unpacked_path():
+
+    if (os.environ.get("SHANNON_UNPACKED_CACHE") == "NO"):
+        return None
+
+    image_hash = shannon_cache.get_image_hash()
+
+    if (image_hash == None):
+        return None
 
-                # buffer max bailout
-                if (dst_index >= cnt):
-                    #shannon_generic.DEBUG("[d] out of bound write to %x/%x/%x\n" % (cnt, dst_index, src_index))
-                    return bytes(list(output_buffer))
+    return os.path.join(shannon_image.cache_dir(), "unpacked", image_hash + ".bin")
+
+# a region of the unpacked container which matches a scatter entry, None if there is none.
+# The size of a decompressed region is not in the table, only copies are checked by size
+def find_unpacked(unpacked, name, entry):
+
+    region = unpacked.get(name)
+
+    if (region == None or region.address != entry[1]):
+        return None
+
+    if (name.startswith("SCATTER_") and region.size != entry[2]):
+        return None
+
+    return region
+
+# read a database range in chunks
+def read_chunks(ea, size):
+
+    offset = 0
+
+    while (offset < size):
+
+        chunk = ida_bytes.get_bytes(ea + offset, min(COPY_CHUNK_SIZE, size - offset))
+
+        if (chunk == None):
+            return
+
+        yield chunk
+
+        offset += len(chunk)
+
+# stream the unpacked regions (segment name, address, size) from the database into the container
+def write_unpacked(unpacked_path, regions):
+
+    os.makedirs(os.path.dirname(unpacked_path), exist_ok=True)
+
+    try:
+        with shannon_image.TocWriter(unpacked_path, len(regions)) as writer:
+            for name, ea, size in regions:
+                writer.add(name, ea, read_chunks(ea, size))
+    except (OSError, ValueError) as e:
+        idc.msg("[e] cannot write unpacked scatter regions: %s\n" % e)
+        return
 
-                if (dst_index >= len(output_buffer)):
-                    output_buffer = output_buffer.ljust(dst_index + 1, b"\x00")
+    idc.msg("[i] wrote %d unpacked scatter regions to %s\n" % (len(regions), unpacked_path))
 
-                # some possible error conditions
-                if (src_ptr > cnt):
-                    #shannon_generic.DEBUG("[d] out of bound read to %x/%x/%x\n" % (cnt, src_ptr, src_index))
-                    return bytes(list(output_buffer))
+# snapshot of a compressed region, the last token may reach past the region
+def read_compressed(src, cnt):
 
-                if (src_ptr < 0):
-                    #shannon_generic.DEBUG("[d] negativ read %x/%x\n" % (src_ptr, src_index))
-                    return bytes(list(output_buffer))
+    compressed = ida_bytes.get_bytes(src, cnt + shannon_decompress.MAX_TOKEN_SIZE)
 
-                # copy byte from previously decompressed data to the current destination
-                output_buffer[dst_index] = output_buffer[src_ptr]
+    if (compressed == None):
+        compressed = ida_bytes.get_bytes(src, cnt)
 
-                dst_index += 1
-                src_ptr += 1
+    if (compressed == None):
+        idc.msg("[e] cannot read compressed scatter at %x\n" % src)
 
-    # return the final source index after decompression
-    return bytes(list(output_buffer))
+    return compressed
 
 
 # for debugging purpose export SHANNON_WORKFLOW="NO"
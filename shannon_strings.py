@@ -0,0 +1,315 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - String Catalog
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# IDA's string list walks the whole database on every refresh. The catalog reads
+# the segment bytes in large chunks instead and finds printable NUL terminated runs
+# with a single regex pass. It is built once and kept for the session, segments
+# which are added later (scatter, MPU, ...) are queued by an IDB hook and scanned
+# the next time the catalog is used. Ranges written by the scatter loader or a cache
+# replay are reported through shannon_cache.record_patch, their strings are dropped
+# and read again.
+
+import idc
+import idaapi
+import ida_bytes
+import ida_idp
+import ida_nalt
+import ida_segment
+import idautils
+
+import array
+import bisect
+import os
+import re
+import struct
+
+# shortest run which is kept in the catalog
+MIN_LENGTH = 4
+
+# segments are read in chunks, the overlap catches strings crossing a chunk border
+CHUNK_SIZE = 0x100000
+CHUNK_OVERLAP = 0x1000
+
+PRINTABLE = rb"[\t\n\r\x20-\x7e]"
+
+# a run must not be preceded by a printable char, else it is the tail of a longer string
+string_re = re.compile(rb"(?<!" + PRINTABLE + rb")" + PRINTABLE + rb"{%d,}\x00" % MIN_LENGTH)
+
+# ea -> string bytes without the terminator
+catalog = {}
+
+# ranges which were read already
+scanned = []
+
+# ranges of added segments which were not read yet
+pending = []
+
+# ranges whose bytes were written after they may have been read
+dirty = []
+
+hooks = None
+
+# find all strings in a buffer, the first byte is only used as look behind
+def find_strings(buffer, base, limit):
+
+    found = []
+
+    for match in string_re.finditer(buffer, 1):
+
+        if (base + match.start() >= limit):
+            break
+
+        found.append((base + match.start(), match.group()[:-1]))
+
+    return found
+
+class segment_hooks_t(ida_idp.IDB_Hooks):
+
+    def __init__(self):
+        ida_idp.IDB_Hooks.__init__(self)
+
+    def segm_added(self, s):
+        pending.append((s.start_ea, s.end_ea))
+        return 0
+
+# parts of a range which were not read yet
+def unscanned(start, end):
+
+    ranges = [(start, end)]
+
+    for scan_start, scan_end in scanned:
+
+        split = []
+
+        for range_start, range_end in ranges:
+
+            if (scan_end <= range_start or scan_start >= range_end):
+                split.append((range_start, range_end))
+                continue
+
+            if (range_start < scan_start):
+                split.append((range_start, scan_start))
+
+            if (scan_end < range_end):
+                split.append((scan_end, range_end))
+
+        ranges = split
+
+    return ranges
+
+# take the parts of a range out of the scanned ranges
+def unmark(start, end):
+
+    split = []
+
+    for scan_start, scan_end in scanned:
+
+        if (scan_end <= start or scan_start >= end):
+            split.append((scan_start, scan_end))
+            continue
+
+        if (scan_start < start):
+            split.append((scan_start, start))
+
+        if (end < scan_end):
+            split.append((end, scan_end))
+
+    scanned[:] = split
+
+# bytes of a range were written, e.g. by the scatter loader. The range is read again the
+# next time the catalog is used
+def invalidate(start, end):
+    dirty.append((start, end))
+
+# drop the strings of all dirty ranges in one pass over the catalog and queue the ranges
+# again. A changed byte can end a string or join it with the bytes behind the range, the
+# overlap behind a range and the full extent of a dropped string are read again as well
+def drop_dirty():
+
+    ranges = []
+
+    for start, end in sorted(dirty):
+
+        end += CHUNK_OVERLAP
+
+        if (len(ranges) > 0 and start <= ranges[-1][1]):
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+        else:
+            ranges.append((start, end))
+
+    dirty.clear()
+
+    starts = [start for start, end in ranges]
+    dropped = []
+
+    for ea in list(catalog):
+
+        str_end = ea + len(catalog[ea]) + 1
+        i = bisect.bisect_left(starts, str_end) - 1
+
+        if (i >= 0 and ranges[i][1] > ea):
+            dropped.append((ea, str_end))
+            del catalog[ea]
+
+    for start, end in ranges + dropped:
+        unmark(start, end)
+        pending.append((start, end))
+
+# read a range chunk by chunk, sparse parts without loaded bytes are skipped. Yields
+# (address of the first byte, chunk, end of the chunk), the first byte is the look
+# behind and the chunk runs into the overlap
+def read_chunks(start, end):
+
+    ea = start
+
+    while (ea < end):
+
+        if (not ida_bytes.is_loaded(ea)):
+
+            ea = ida_bytes.next_inited(ea, end)
+
+            if (ea == idaapi.BADADDR or ea >= end):
+                break
+
+        size = min(CHUNK_SIZE, end - ea)
+        read_start = max(ea - 1, 0)
+        read_end = min(ea + size + CHUNK_OVERLAP, end)
+
+        chunk = ida_bytes.get_bytes(read_start, read_end - read_start)
+
+        if (chunk != None):
+
+            # pad the look behind byte at address 0
+            if (read_start == ea):
+                chunk = b"\x00" + chunk
+
+            yield (ea - 1, chunk, ea + size)
+
+        ea += size
+
+def scan_range(start, end):
+
+    found = 0
+
+    for base, chunk, limit in read_chunks(start, end):
+        for str_ea, text in find_strings(chunk, base, limit):
+            catalog[str_ea] = text
+            found += 1
+
+    scanned.append((start, end))
+
+    return found
+
+# run a compiled bytes regex over the raw bytes of all segments, yields (ea, match),
+# the pattern may look one byte behind
+def search(pattern):
+
+    for s in idautils.Segments():
+
+        for base, chunk, limit in read_chunks(idc.get_segm_start(s), idc.get_segm_end(s)):
+
+            for match in pattern.finditer(chunk, 1):
+
+                if (base + match.start() >= limit):
+                    break
+
+                yield (base + match.start(), match)
+
+# code references of many strings at once. A single pass over the aligned words of
+# the code segments finds the literal pools which hold one of the addresses, the
+# loads of a pool are the references. Strings without a pool word (MOVW/MOVT, ADR)
+# fall back to their own xrefs. Returns a dict string ea -> list of referencing eas
+def find_references(targets):
+
+    refs = {target: [] for target in targets}
+    pools = []
+
+    for s in idautils.Segments():
+
+        if (ida_segment.get_segm_class(ida_segment.getseg(s)) != "CODE"):
+            continue
+
+        for base, chunk, limit in read_chunks(idc.get_segm_start(s), idc.get_segm_end(s)):
+
+            # skip the look behind and align to a word boundary
+            skip = -base % 4
+            words = memoryview(chunk)[skip:skip + (len(chunk) - skip) // 4 * 4]
+
+            for target in refs.keys() & set(array.array("I", words)):
+
+                needle = struct.pack("<I", target)
+                offset = chunk.find(needle, skip)
+
+                while (offset >= 0 and base + offset < limit):
+
+                    if ((offset - skip) % 4 == 0):
+                        pools.append((base + offset, target))
+
+                    offset = chunk.find(needle, offset + 1)
+
+    for pool, target in pools:
+        for xref in idautils.XrefsTo(pool, 0):
+            refs[target].append(xref.frm)
+
+    for target in refs:
+        if (len(refs[target]) == 0):
+            refs[target] = [xref.frm for xref in idautils.XrefsTo(target, 0)]
+
+    return refs
+
+# scan everything queued by the hook
+def update():
+
+    global hooks
+
+    if (hooks == None):
+
+        hooks = segment_hooks_t()
+        hooks.hook()
+
+        for s in idautils.Segments():
+            pending.append((idc.get_segm_start(s), idc.get_segm_end(s)))
+
+    if (len(dirty) > 0):
+        drop_dirty()
+
+    found = 0
+
+    while (len(pending) > 0):
+
+        start, end = pending.pop(0)
+
+        for range_start, range_end in unscanned(start, end):
+            found += scan_range(range_start, range_end)
+
+    if (found > 0):
+        idc.msg("[i] string catalog: %d new strings, %d total\n" % (found, len(catalog)))
+
+# all cataloged strings of a minimum length as (ea, bytes), ordered by address
+def get_strings(minlen=MIN_LENGTH):
+
+    update()
+
+    return [(ea, catalog[ea]) for ea in sorted(catalog) if len(catalog[ea]) >= minlen]
+
+# create string items for all cataloged strings on unknown bytes, in one pass
+def create_strings(minlen):
+
+    created = 0
+
+    for ea, text in get_strings(minlen):
+
+        # sanity check, is unknown bytes?
+        if (idc.is_unknown(idc.get_full_flags(ea))):
+            ida_bytes.create_strlit(ea, len(text) + 1, ida_nalt.STRTYPE_TERMCHR)
+            created += 1
+
+    return created
+
+#for debugging purpose export SHANNON_WORKFLOW="NO"
+if (os.environ.get('SHANNON_WORKFLOW') == "NO"):
+    idc.msg("[i] running strings in standalone mode\n")
+    update()
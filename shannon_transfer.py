@@ -0,0 +1,191 @@
+#!/bin/python3
+
+# Samsung Shannon Modem Loader - Cross Build Name Transfer
+# A lean IDA Pro loader for fancy baseband research
+# Alexander Pick 2024-2025
+
+# Most functions do not change between two Shannon builds, only their addresses do.
+# The exporter hashes every named function over its normalised instructions (branch
+# targets and literal pool references are masked) together with the shape of its
+# flow chart. The importer hashes the unnamed functions of a new image in one pass
+# and applies names and types of unique matches. Transferred functions are skipped
+# by the naming heuristics afterwards.
+
+import idc
+import idaapi
+import idautils
+import ida_bytes
+import ida_funcs
+import ida_name
+import ida_typeinf
+import ida_ua
+
+import hashlib
+import json
+import os
+import struct
+
+import shannon_funcs
+
+TRANSFER_VERSION = 1
+
+# tiny functions are mostly wrappers and stubs which look the same everywhere
+MIN_INSTRUCTIONS = 4
+
+# operand types which carry addresses, these change between builds
+ADDRESS_OPERANDS = (ida_ua.o_near, ida_ua.o_far, ida_ua.o_mem)
+
+# hash a function over its normalised instructions and its flow chart shape
+def function_hash(func_o):
+
+    digest = hashlib.sha1()
+    insn = ida_ua.insn_t()
+    count = 0
+
+    for ea in idautils.FuncItems(func_o.start_ea):
+
+        # data inside of the function is a literal pool, only its presence counts
+        if (not idc.is_code(ida_bytes.get_flags(ea))):
+            digest.update(b"D")
+            continue
+
+        size = ida_ua.decode_insn(insn, ea)
+
+        if (size == 0):
+            continue
+
+        count += 1
+
+        digest.update(struct.pack("<HB", insn.itype, size))
+
+        masked = False
+
+        for op in insn.ops:
+
+            if (op.type == ida_ua.o_void):
+                break
+
+            if (op.type in ADDRESS_OPERANDS):
+                masked = True
+
+            digest.update(struct.pack("<B", op.type))
+
+        # keep registers and immediates, drop the offsets
+        if (not masked):
+            digest.update(ida_bytes.get_bytes(ea, size))
+
+    if (count < MIN_INSTRUCTIONS):
+        return None
+
+    shape = []
+
+    for block in idaapi.FlowChart(func_o):
+        shape.append((block.end_ea - block.start_ea, len(list(block.succs())), len(list(block.preds()))))
+
+    digest.update(repr(sorted(shape)).encode())
+
+    return digest.hexdigest()
+
+def is_named(func_name):
+    return (not func_name.startswith("sub_"))
+
+# export all named functions of the database
+def export_names(path):
+
+    idc.msg("[i] exporting function hashes to %s\n" % path)
+
+    table = {}
+    ambiguous = set()
+
+    for function_ea in idautils.Functions():
+
+        func_name = ida_funcs.get_func_name(function_ea)
+
+        if (not is_named(func_name)):
+            continue
+
+        func_hash = function_hash(ida_funcs.get_func(function_ea))
+
+        if (func_hash == None):
+            continue
+
+        if (func_hash in table and table[func_hash]["name"] != func_name):
+            ambiguous.add(func_hash)
+            continue
+
+        table[func_hash] = {
+            "name": func_name,
+            "type": idc.get_type(function_ea),
+            "cmt": idc.get_func_cmt(function_ea, 1),
+        }
+
+    # the same code under different names cannot be transferred
+    for func_hash in ambiguous:
+        del table[func_hash]
+
+    with open(path, "w") as f:
+        json.dump({"version": TRANSFER_VERSION, "functions": table}, f)
+
+    idc.msg("[i] exported %d function hashes, %d ambiguous dropped\n" % (len(table), len(ambiguous)))
+
+    return len(table)
+
+# apply names of a previous export to unnamed functions, one pass over the database
+def import_names(path):
+
+    idc.msg("[i] importing function names from %s\n" % path)
+
+    with open(path) as f:
+        export = json.load(f)
+
+    if (export.get("version") != TRANSFER_VERSION):
+        idc.msg("[e] unsupported transfer file version\n")
+        return 0
+
+    table = export["functions"]
+
+    # a hash may match several functions in the new image, those are not unique
+    matches = {}
+
+    for function_ea in idautils.Functions():
+
+        if (is_named(ida_funcs.get_func_name(function_ea))):
+            continue
+
+        func_hash = function_hash(ida_funcs.get_func(function_ea))
+
+        if (func_hash in table):
+            matches.setdefault(func_hash, []).append(function_ea)
+
+    transferred = 0
+
+    for func_hash, eas in matches.items():
+
+        if (len(eas) > 1):
+            continue
+
+        function_ea = eas[0]
+        entry = table[func_hash]
+
+        ida_name.set_name(function_ea, shannon_funcs.function_find_name(entry["name"]),
+                          ida_name.SN_NOCHECK | ida_name.SN_FORCE)
+
+        if (entry["type"]):
+            tif = ida_typeinf.tinfo_t()
+            if (ida_typeinf.parse_decl(tif, None, entry["type"] + ";", ida_typeinf.PT_SIL) != None):
+                ida_typeinf.apply_tinfo(function_ea, tif, ida_typeinf.TINFO_DEFINITE)
+
+        if (entry["cmt"]):
+            idc.set_func_cmt(function_ea, entry["cmt"], 1)
+
+        shannon_funcs.transferred_functions.add(function_ea)
+
+        transferred += 1
+
+    idc.msg("[i] transferred %d of %d exported names\n" % (transferred, len(table)))
+
+    return transferred
+
+#for debugging purpose export SHANNON_WORKFLOW="NO"
+if (os.environ.get('SHANNON_WORKFLOW') == "NO"):
+    idc.msg("[i] running name transfer in standalone mode\n")